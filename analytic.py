@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Closed form convolution of piecewise exponential signals.
+
+An expression is analyzed into a sum of pieces c*exp(a*t) on [t0, t1). The
+forms recognized are the constants, exp, sin and cos of a*t+b (sin and cos
+give complex exponentials), comparisons of t with a constant (steps) and
+hstack of zeros(n) and ones(n) blocks, combined with +, -, * and /.
+The convolution of two pieces is an exponential integral, so the result is
+exact and costs O(N) for N output times per pair of pieces. Other
+expressions give None and the numeric engines are used, as well as when
+estimateCost is above the cost of the numeric engine.
+
+Convolution exacte des signaux constants par morceaux et exponentiels.
+
+License : GPL 3
+"""
+
+import ast
+
+import numpy as np
+
+import engine
+from timeaxis import TimeAxis
+
+# Above this number of pieces in a signal the numeric engines are used
+MAX_PIECES = 32
+# Cost of one output time for a pair of real or complex pieces, measured
+# against the FFT engine in the units of engine.estimateCost
+POINT_COST = 60
+COMPLEX_POINT_COST = 300
+# Times computed at once, bounds the size of the temporary arrays
+CHUNK = 2**16
+
+
+class NotAnalytic(Exception):
+    pass
+
+
+class Affine:
+    """a*t + b, only valid as the argument of a function or a comparison."""
+    def __init__(self, a, b=0):
+        self.a = a
+        self.b = b
+
+
+class Block:
+    """count samples of the same value, an element of hstack."""
+    def __init__(self, count, value):
+        self.count = count
+        self.value = value
+
+
+def isNumber(value):
+    return isinstance(value, (int, float, complex, np.number)) and not isinstance(value, bool)
+
+
+def constant(value):
+    return [(value, 0, -np.inf, np.inf)]
+
+
+def multiplyPieces(first, second):
+    pieces = [(c1*c2, a1+a2, max(start1, start2), min(stop1, stop2))
+              for c1, a1, start1, stop1 in first
+              for c2, a2, start2, stop2 in second
+              if max(start1, start2) < min(stop1, stop2) and c1*c2 != 0]
+    return checkPieces(pieces)
+
+
+def checkPieces(pieces):
+    if len(pieces) > MAX_PIECES:
+        raise NotAnalytic("Too many pieces")
+    return pieces
+
+
+class Analyzer(ast.NodeVisitor):
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def generic_visit(self, node):
+        raise NotAnalytic(type(node).__name__)
+
+    def signal(self, value):
+        if isNumber(value):
+            return constant(value)
+        if isinstance(value, list):
+            return value
+        raise NotAnalytic("Not a signal")
+
+    def visit_Constant(self, node):
+        if not isNumber(node.value):
+            raise NotAnalytic(repr(node.value))
+        return node.value
+
+    def visit_Name(self, node):
+        if node.id == 't':
+            return Affine(1)
+        if node.id == 'pi':
+            return np.pi
+        raise NotAnalytic(node.id)
+
+    def visit_UnaryOp(self, node):
+        value = self.visit(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return value
+        if not isinstance(node.op, ast.USub):
+            raise NotAnalytic(type(node.op).__name__)
+        return self.multiply(-1, value)
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if isinstance(node.op, ast.Add):
+            return self.add(left, right)
+        if isinstance(node.op, ast.Sub):
+            return self.add(left, self.multiply(-1, right))
+        if isinstance(node.op, ast.Mult):
+            return self.multiply(left, right)
+        if isinstance(node.op, ast.Div) and isNumber(right) and right != 0:
+            return self.multiply(1.0/right, left)
+        if isinstance(node.op, ast.Pow) and isNumber(left) and isNumber(right):
+            return left**right
+        raise NotAnalytic(type(node.op).__name__)
+
+    def add(self, left, right):
+        if isNumber(left) and isNumber(right):
+            return left + right
+        if isinstance(left, Affine) or isinstance(right, Affine):
+            if isNumber(right):
+                left, right = right, left
+            if isNumber(left):
+                return Affine(right.a, right.b + left)
+            if isinstance(left, Affine) and isinstance(right, Affine):
+                return Affine(left.a + right.a, left.b + right.b)
+            raise NotAnalytic("t is not a piecewise exponential")
+        return checkPieces(self.signal(left) + self.signal(right))
+
+    def multiply(self, left, right):
+        if isNumber(right):
+            left, right = right, left
+        if isNumber(left):
+            if isNumber(right):
+                return left*right
+            if isinstance(right, Affine):
+                return Affine(left*right.a, left*right.b)
+            if isinstance(right, Block):
+                return Block(right.count, left*right.value)
+            return [(left*c, a, start, stop) for c, a, start, stop in right]
+        if isinstance(left, list) and isinstance(right, list):
+            return multiplyPieces(left, right)
+        raise NotAnalytic("Unsupported product")
+
+    def visit_Compare(self, node):
+        # Steps such as (t > 2) or (1 <= t < 3)
+        pieces = constant(1)
+        left = self.visit(node.left)
+        for operator, comparator in zip(node.ops, node.comparators):
+            right = self.visit(comparator)
+            pieces = multiplyPieces(pieces, self.step(left, operator, right))
+            left = right
+        return pieces
+
+    def step(self, left, operator, right):
+        if isinstance(operator, (ast.Gt, ast.GtE)):
+            left, right = right, left
+        elif not isinstance(operator, (ast.Lt, ast.LtE)):
+            raise NotAnalytic(type(operator).__name__)
+        # left < right
+        if isinstance(left, Affine) and isNumber(right) and left.a != 0:
+            bound, smaller = (right - left.b)/left.a, left.a > 0
+        elif isinstance(right, Affine) and isNumber(left) and right.a != 0:
+            bound, smaller = (left - right.b)/right.a, right.a < 0
+        else:
+            raise NotAnalytic("Unsupported comparison")
+        if isinstance(bound, complex):
+            raise NotAnalytic("Complex bound")
+        return [(1, 0, -np.inf, bound)] if smaller else [(1, 0, bound, np.inf)]
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise NotAnalytic("Unsupported call")
+        name = node.func.id
+        if name == 'hstack' and len(node.args) == 1:
+            return self.hstack(node.args[0])
+        if name in ('ones', 'zeros') and len(node.args) == 1:
+            count = self.visit(node.args[0])
+            if not isinstance(count, int) or count < 0:
+                raise NotAnalytic("Unsupported size")
+            return Block(count, 1 if name == 'ones' else 0)
+        if name not in ('exp', 'sin', 'cos') or len(node.args) != 1:
+            raise NotAnalytic(name)
+        argument = self.visit(node.args[0])
+        if isNumber(argument):
+            return getattr(np, name)(argument)
+        if not isinstance(argument, Affine):
+            raise NotAnalytic("Unsupported argument of " + name)
+        a, b = argument.a, argument.b
+        if name == 'exp':
+            return [(np.exp(b), a, -np.inf, np.inf)]
+        positive = np.exp(1j*b)/2
+        negative = np.exp(-1j*b)/2
+        if name == 'sin':
+            positive, negative = positive/1j, -negative/1j
+        return [(positive, 1j*a, -np.inf, np.inf), (negative, -1j*a, -np.inf, np.inf)]
+
+    def hstack(self, node):
+        # The blocks take the same fraction of the range as of the samples
+        if not isinstance(node, (ast.Tuple, ast.List)):
+            raise NotAnalytic("Unsupported hstack")
+        blocks = [self.visit(element) for element in node.elts]
+        if not all(isinstance(block, Block) for block in blocks):
+            raise NotAnalytic("Unsupported hstack")
+        total = sum(block.count for block in blocks)
+        if total == 0:
+            raise NotAnalytic("Empty hstack")
+        length = self.maximum - self.minimum
+        pieces = []
+        start = 0
+        for block in blocks:
+            if block.value != 0 and block.count > 0:
+                pieces.append((block.value, 0, self.minimum + length*start/total,
+                               self.minimum + length*(start + block.count)/total))
+            start += block.count
+        return checkPieces(pieces)
+
+
+def analyzeExpression(source, minimum, maximum):
+    """Pieces (c, a, t0, t1) of the expression sampled on [minimum, maximum], or None."""
+    try:
+        analyzer = Analyzer(minimum, maximum)
+        value = analyzer.visit(ast.parse(source.strip(), mode='eval').body)
+        if isinstance(value, Block):
+            value = [(value.value, 0, minimum, maximum)] if value.value != 0 else []
+        pieces = analyzer.signal(value)
+    except (NotAnalytic, SyntaxError, ZeroDivisionError, OverflowError):
+        return None
+    # The signal is zero outside of the range where it is sampled
+    return [(c, a, max(start, minimum), min(stop, maximum))
+            for c, a, start, stop in pieces if max(start, minimum) < min(stop, maximum)]
+
+
+def shiftPieces(pieces, offset):
+    """Pieces of the signal s(t+offset)."""
+    return [(c*np.exp(a*offset), a, start-offset, stop-offset) for c, a, start, stop in pieces]
+
+
+def pairSpans(xPieces, hPieces, t):
+    """Index ranges of the sorted times t where each pair of pieces overlaps."""
+    for c1, a1, start1, stop1 in xPieces:
+        for c2, a2, start2, stop2 in hPieces:
+            # x(s)h(t-s) is not zero for start1+start2 < t < stop1+stop2
+            first = int(t.searchsorted(start1 + start2, side='right'))
+            last = int(t.searchsorted(stop1 + stop2, side='left'))
+            if first < last:
+                yield (c1, a1, start1, stop1), (c2, a2, start2, stop2), first, last
+
+
+def estimateCost(xPieces, hPieces, t):
+    """Rough number of operations of convolvePieces, in the units of engine.estimateCost."""
+    cost = 0.0
+    for (c1, a1, start1, stop1), (c2, a2, start2, stop2), first, last in pairSpans(xPieces, hPieces, t):
+        isComplex = any(isinstance(value, complex) for value in (c1, a1, c2, a2))
+        cost += (last - first)*(COMPLEX_POINT_COST if isComplex else POINT_COST)
+    return cost
+
+
+def convolvePieces(xPieces, hPieces, t, out=None, cancelled=None):
+    """Exact value of the integral of x(s)h(t-s) ds at the sorted times t, written in out if given.
+
+    t is an array or a TimeAxis, only CHUNK times are built at once. The
+    cancelled callable is polled between pairs of pieces.
+    """
+    if not isinstance(t, TimeAxis):
+        t = np.asarray(t, dtype=float)
+    # Accumulated in out when it is float64, in a temporary array otherwise
+    inPlace = out is not None and out.dtype == np.float64
+    result = out if inPlace else np.zeros(len(t))
+    if inPlace:
+        result.fill(0)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for (c1, a1, start1, stop1), (c2, a2, start2, stop2), first, last in pairSpans(xPieces, hPieces, t):
+            if cancelled is not None and cancelled():
+                raise engine.ComputationCancelled()
+            d = a1 - a2
+            for begin in range(first, last, CHUNK):
+                end = min(begin + CHUNK, last)
+                times = np.asarray(t[begin:end], dtype=float)
+                # x piece on [start1, stop1), h piece on t-s in [start2, stop2)
+                low = np.maximum(start1, times-stop2)
+                width = np.minimum(stop1, times-start2) - low
+                integral = width if d == 0 else np.expm1(d*width)/d
+                # The imaginary parts of conjugate pieces cancel out
+                result[begin:end] += np.real(c1*c2*np.exp(a1*low + a2*(times-low))*integral)
+    if out is None or inPlace:
+        return result
+    out[...] = result
+    return out
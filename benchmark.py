@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths of the convolution and of the interface.
+
+Each stage is timed (best and median of several runs) and its peak memory
+measured with tracemalloc, for a sweep of point counts, kernel lengths and
+echo rates. The redraw of App.plotUpdate runs on an offscreen Qt platform
+with the Agg renderer, and the cold start of main.py is timed in a new
+interpreter. Results are written to JSON, and two JSON files can
+be compared to flag the stages that became slower.
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json
+    python benchmark.py --compare before.json after.json
+
+Mesures de performance des parties critiques du programme.
+
+License : GPL 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import convolution as convolutionModule
+from convolution import Convolution
+import engine
+
+
+def measure(function, repeat):
+    """Best and median time of repeat calls, and peak memory of one more call."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'time': min(times), 'median': float(np.median(times)), 'peak': peak}
+
+
+def benchmarkEngines(points, kernels, repeat):
+    rng = np.random.default_rng(0)
+    results = []
+    for n in points:
+        x = rng.standard_normal(n)
+        for m in kernels:
+            h = rng.standard_normal(m)
+            for method in ('direct', 'fft', 'overlap-add'):
+                # The direct method is quadratic, only measured while it stays short
+                if method == 'direct' and float(n)*m > 1e10:
+                    continue
+                result = measure(lambda: engine.convolve(x, h, method), repeat)
+                results.append(dict(result, stage='convolution', engine=method, points=n, kernel=m))
+    return results
+
+
+def benchmarkExpressions(points, repeat):
+    results = []
+    for n in points:
+        convolution = Convolution()
+        convolution.setPoints(n)
+        convolution.setXFunction('sin(2*pi*t)*exp(-t/5)')
+        
+        def evaluate():
+            convolution.invalidate('x')
+            convolution.getXfunction()
+            
+        def cold():
+            convolutionModule.sampleCache.clear()
+            evaluate()
+        results.append(dict(measure(cold, repeat), stage='expression', cache='cold', points=n))
+        results.append(dict(measure(evaluate, repeat), stage='expression', cache='cached', points=n))
+    return results
+
+
+def benchmarkEchos(points, echoRates, repeat):
+    results = []
+    for n in points:
+        convolution = Convolution()
+        convolution.setPoints(n)
+        convolution.setXFunction('sin(t)')
+        convolution.setTau(convolution.getMaxRangeX()*0.9)
+        for echoRate in echoRates:
+            convolution.setEchoRate(echoRate)
+            
+            def echos():
+                convolution.invalidate('echos')
+                convolution.getEchoProducts()
+            results.append(dict(measure(echos, repeat), stage='echos', points=n, echoRate=echoRate))
+    return results
+
+
+def benchmarkRedraw(points, echoRates, repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    import matplotlib
+    matplotlib.use('Qt5Agg')
+    import main
+    # Everything on the calling thread so the computation is part of the time
+    main.ASYNC_POINTS = float('inf')
+    # Defaults and no disk cache, so each case is really computed
+    main.LAST_SESSION = None
+    application = QApplication.instance() or QApplication(sys.argv)
+    app = main.App()
+    app.diskCache = app.convolution.diskCache = None
+    app.createCanvas()
+    application.processEvents()
+    results = []
+    for n in points:
+        app.convolution.setXFunction('sin(t)')
+        app.convolution.setPoints(n)
+        app.plotUpdate()
+        for echoRate in echoRates:
+            app.convolution.setEchoRate(echoRate)
+            
+            def full():
+                convolutionModule.sampleCache.clear()
+                app.convolution.invalidate('rangeX')
+                app.convolution.invalidate('rangeH')
+                app.plotUpdate()
+                application.processEvents()
+                
+            taus = iter(np.tile(np.linspace(app.convolution.getMinRangeX(), app.convolution.getMaxRangeX(), 50), 1000))
+            
+            def moveTau():
+                app.convolution.setTau(next(taus))
+                app.plotUpdate()
+                application.processEvents()
+            results.append(dict(measure(full, repeat), stage='redraw', kind='full', points=n, echoRate=echoRate))
+            results.append(dict(measure(moveTau, repeat), stage='redraw', kind='tau', points=n, echoRate=echoRate))
+    app.close()
+    return results
+
+
+def benchmarkStartup(repeat):
+    """Cold start of main.py in a new interpreter, up to the window, the figures and the first plot."""
+    environment = dict(os.environ)
+    environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, script, '--startup-time', '--new-session'], env=environment,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return [{'time': min(run[kind] for run in runs), 'median': float(np.median([run[kind] for run in runs])),
+             'peak': 0, 'stage': 'startup', 'kind': kind} for kind in ('window', 'figures', 'firstPlot')]
+
+
+def caseName(result):
+    return ' '.join('{}={}'.format(key, value) for key, value in sorted(result.items())
+                    if key not in ('time', 'median', 'peak'))
+
+
+def compare(before, after, threshold):
+    """Print the ratio of the times of the common cases, returns the slower ones."""
+    old = {caseName(result): result for result in before['results']}
+    slower = []
+    for result in after['results']:
+        name = caseName(result)
+        if name not in old:
+            continue
+        ratio = result['time']/old[name]['time'] if old[name]['time'] > 0 else float('inf')
+        flag = ' <-- plus lent' if ratio > threshold else ''
+        print('{:70s} {:10.6f} s -> {:10.6f} s  x{:5.2f}{}'.format(name, old[name]['time'], result['time'], ratio, flag))
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def listArgument(text):
+    return [int(float(value)) for value in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesures de performance de la convolution")
+    parser.add_argument('--points', type=listArgument, default=[1000, 10000, 100000, 1000000],
+                        help="nombres de points, séparés par des virgules")
+    parser.add_argument('--kernels', type=listArgument, default=[10, 1000, 100000],
+                        help="longueurs de h pour les moteurs")
+    parser.add_argument('--echo-rates', type=listArgument, default=[1, 30, 300],
+                        help="valeurs de echoRate")
+    parser.add_argument('--repeat', type=int, default=5, help="nombre de mesures par cas")
+    parser.add_argument('--no-gui', action='store_true', help="sans la mesure du rafraîchissement")
+    parser.add_argument('--output', default='benchmark.json', help="fichier JSON des résultats")
+    parser.add_argument('--compare', nargs=2, metavar=('AVANT', 'APRES'), help="compare deux fichiers de résultats")
+    parser.add_argument('--threshold', type=float, default=1.2, help="rapport de temps signalé comme ralentissement")
+    arguments = parser.parse_args(argv)
+    
+    if arguments.compare:
+        with open(arguments.compare[0]) as beforeFile, open(arguments.compare[1]) as afterFile:
+            slower = compare(json.load(beforeFile), json.load(afterFile), arguments.threshold)
+        print('{} cas plus lents'.format(len(slower)))
+        return 1 if slower else 0
+    
+    results = benchmarkEngines(arguments.points, arguments.kernels, arguments.repeat)
+    results += benchmarkExpressions(arguments.points, arguments.repeat)
+    results += benchmarkEchos(arguments.points, arguments.echo_rates, arguments.repeat)
+    if not arguments.no_gui:
+        results += benchmarkRedraw(arguments.points, arguments.echo_rates, arguments.repeat)
+        results += benchmarkStartup(arguments.repeat)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    with open(arguments.output, 'w') as outputFile:
+        json.dump({'meta': meta, 'results': results}, outputFile, indent=1)
+    for result in results:
+        print('{:70s} {:10.6f} s {:12d} o'.format(caseName(result), result['time'], result['peak']))
+    for result in results:
+        if result['stage'] == 'startup' and result['kind'] == 'window':
+            import main
+            status = 'atteint' if result['median'] <= main.STARTUP_TARGET else 'non atteint'
+            print('Fenêtre affichée en {:.3f} s, objectif {} s {}'.format(result['median'], main.STARTUP_TARGET, status))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
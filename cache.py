@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Least recently used cache of NumPy arrays bounded by their memory size.
+
+Cache LRU de tableaux NumPy limité par la mémoire occupée.
+
+License : GPL 3
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+def sizeOf(value):
+    """Bytes held by an array, or by the arrays of a list, tuple or dict."""
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(sizeOf(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(sizeOf(item) for item in value)
+    return 0
+
+
+class LRUCache:
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.currentBytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        size = sizeOf(value)
+        with self.lock:
+            if key in self.entries:
+                self.currentBytes -= sizeOf(self.entries.pop(key))
+            # Values larger than the whole cache are not kept
+            if size > self.maxBytes:
+                return value
+            self.entries[key] = value
+            self.currentBytes += size
+            while self.currentBytes > self.maxBytes:
+                oldKey, oldValue = self.entries.popitem(last=False)
+                self.currentBytes -= sizeOf(oldValue)
+        return value
+    
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.currentBytes = 0
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Command line computation of convolutions, without the graphical interface.
+
+Only NumPy is imported. A single job is described by the options, or many
+jobs are read from a JSON file (a list of objects, or one object per line)
+using the keys of Convolution.getSettings. Each result is written as a .npy
+file holding the rows t and x*h, or as a CSV file with the same columns.
+
+    python cli.py --x "sin(t)" --h "exp(-t)" --range-x 0 10 --points 100000
+    python cli.py --jobs jobs.json --output results --format csv
+
+Calcul de convolutions en ligne de commande, sans interface graphique.
+
+License : GPL 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from convolution import Convolution
+from diskcache import DiskCache
+
+
+def readJobs(path):
+    """Jobs from a JSON list or from JSON lines."""
+    with open(path) as jobFile:
+        text = jobFile.read()
+    try:
+        jobs = json.loads(text)
+    except ValueError:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(jobs, dict):
+        jobs = [jobs]
+    return jobs
+
+
+def unknownKeys(job):
+    """Keys of job that are not settings of Convolution, ignored by applySettings."""
+    known = set(Convolution().getSettings()) | {'name'}
+    return sorted(set(job) - known)
+
+
+def runJob(job, diskCache=None):
+    """Compute one job, returns its name, result and the time of each stage."""
+    convolution = Convolution()
+    convolution.diskCache = diskCache
+    settings = {key: value for key, value in job.items() if key != 'name'}
+    convolution.applySettings(settings)
+    timings = {}
+    start = time.perf_counter()
+    convolution.getXfunction()
+    timings['x'] = time.perf_counter() - start
+    start = time.perf_counter()
+    convolution.getHfunction()
+    timings['h'] = time.perf_counter() - start
+    start = time.perf_counter()
+    result = convolution.getConvolution()
+    timings['convolution'] = time.perf_counter() - start
+    return {'name': job.get('name'), 'settings': convolution.getSettings(),
+            'result': result, 'timings': timings}
+
+
+def writeResult(output, directory, fileFormat):
+    os.makedirs(directory, exist_ok=True)
+    table = np.vstack(output['result'])
+    if fileFormat == 'csv':
+        path = os.path.join(directory, output['name'] + '.csv')
+        np.savetxt(path, table.T, delimiter=',', header='t,result', comments='')
+    else:
+        path = os.path.join(directory, output['name'] + '.npy')
+        np.save(path, table)
+    return path
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Convolution de x(t) et h(t) sans interface graphique")
+    parser.add_argument('--x', dest='XFunction', help="fonction x(t)")
+    parser.add_argument('--h', dest='HFunction', help="fonction h(t)")
+    parser.add_argument('--range-x', nargs=2, type=float, metavar=('MIN', 'MAX'), help="intervalle de t pour x(t)")
+    parser.add_argument('--range-h', nargs=2, type=float, metavar=('MIN', 'MAX'), help="intervalle de t pour h(t)")
+    parser.add_argument('--points', type=int, help="nombre de points du vecteur t")
+    parser.add_argument('--engine', help="moteur de convolution : auto, direct, fft ou overlap-add")
+    parser.add_argument('--numeric', dest='analytic', action='store_false', default=None,
+                        help="toujours utiliser le moteur numérique, sans la forme analytique exacte")
+    parser.add_argument('--lean', action='store_true', default=None,
+                        help="mode économe en mémoire : axes du temps calculés au besoin et tampons réutilisés")
+    parser.add_argument('--dtype', choices=('float64', 'float32'), help="précision des vecteurs")
+    parser.add_argument('--cache', help="répertoire du cache des résultats sur disque")
+    parser.add_argument('--jobs', help="fichier JSON de calculs à effectuer")
+    parser.add_argument('--output', default='.', help="répertoire des résultats")
+    parser.add_argument('--format', default='npy', choices=('npy', 'csv'), help="format des résultats")
+    return parser.parse_args(argv)
+
+
+def jobFromArguments(arguments):
+    job = {'name': 'convolution'}
+    for key in ('XFunction', 'HFunction', 'points', 'engine', 'analytic', 'lean', 'dtype'):
+        if getattr(arguments, key) is not None:
+            job[key] = getattr(arguments, key)
+    if arguments.range_x is not None:
+        job['minRangeX'], job['maxRangeX'] = arguments.range_x
+    if arguments.range_h is not None:
+        job['minRangeH'], job['maxRangeH'] = arguments.range_h
+    return job
+
+
+def main(argv=None):
+    arguments = parseArguments(argv)
+    jobs = readJobs(arguments.jobs) if arguments.jobs else [jobFromArguments(arguments)]
+    diskCache = DiskCache(arguments.cache) if arguments.cache else None
+    start = time.perf_counter()
+    failed = 0
+    for number, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            failed += 1
+            print('convolution{:04d}: erreur : un calcul est un objet JSON, pas {!r}'.format(number, job), file=sys.stderr)
+            continue
+        job.setdefault('name', 'convolution{:04d}'.format(number))
+        unknown = unknownKeys(job)
+        if unknown:
+            print('{}: clés inconnues ignorées : {}'.format(job['name'], ', '.join(unknown)), file=sys.stderr)
+        try:
+            output = runJob(job, diskCache)
+            path = writeResult(output, arguments.output, arguments.format)
+        except (TypeError, ValueError) as error:
+            # Invalid expressions (ExpressionError) and settings of a wrong
+            # type or value, the other jobs still run
+            failed += 1
+            print('{}: erreur : {}'.format(job['name'], error), file=sys.stderr)
+            continue
+        timings = output['timings']
+        print('{}: x {:.4f} s, h {:.4f} s, convolution {:.4f} s -> {}'.format(
+            output['name'], timings['x'], timings['h'], timings['convolution'], path))
+    print('{} calculs en {:.3f} s, {} en erreur'.format(len(jobs), time.perf_counter() - start, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
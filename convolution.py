@@ -11,8 +11,20 @@ convolution.
 License : GPL 3
 """
 
+import copy
+from functools import partial
+
 import numpy as np
 
+import analytic
+import engine
+import streaming
+from profiling import profiler
+from cache import LRUCache
+from expression import compileExpression, safeDictionary, sampleExpression
+from stages import StagedComputation
+from timeaxis import TimeAxis
+
 __author__ = "Audrey Corbeil Therrien"
 __copyright__ = '2019, ConstructionConvolution'
 __credits__ = ["Audrey Corbeil Therrien"]
@@ -22,8 +34,40 @@ __maintainer__ = "Audrey Corbeil Therrien"
 __email__ = "therria@stanford.edu"
 __status__ = "Prototype"
 
-class Convolution:
+# Stages of the computation and the stages that depend on them. Changing an
+# input only invalidates its stage and what comes after it, moving tau only
+# touches the echos.
+STAGES = {'rangeX': ('x',),
+          'rangeH': ('h',),
+          'x': ('convolution', 'echos'),
+          'h': ('convolution', 'echos'),
+          'convolution': (),
+          'echos': (),
+          }
+
+# Attributes holding the output of each stage
+STAGE_OUTPUTS = {'rangeX': ('rangeX',),
+                 'rangeH': ('rangeH',),
+                 'x': ('x',),
+                 'h': ('h',),
+                 'convolution': ('result', 'convolveRange'),
+                 'echos': ('echos', 'echoProducts'),
+                 }
+
+# Stages long enough to be computed away from the interface
+HEAVY_STAGES = ('rangeX', 'rangeH', 'x', 'h', 'convolution')
+
+# Sampled x(t) and h(t), shared by all the instances
+sampleCache = LRUCache(64*2**20)
+# Transforms of h(t) at the padded sizes used by the engines, keyed by
+# stageKey('h') and the FFT size
+spectrumCache = LRUCache(64*2**20)
+
+class Convolution(StagedComputation):
+    STAGES = STAGES
+    
     def __init__(self):
+        super().__init__()
         
         self.minrangeX = 0
         self.maxrangeX = 10
@@ -34,22 +78,94 @@ class Convolution:
         self.step = (self.maxrangeX - self.minrangeX)/self.points
         self.echoRate = 1
         self.echoPoints = int(self.points/self.echoRate)
-        #self.rangeX = np.arange(self.minrangeX, self.maxrangeX, self.step)
-        #self.rangeH = np.arange(self.minrangeH, self.maxrangeH, self.step)
-        self.rangeX = np.linspace(self.minrangeX, self.maxrangeX, self.points)
-        self.rangeH = np.linspace(self.minrangeH, self.maxrangeH, self.points)
-        self.XFunctionString = 'hstack((zeros(200), ones(300), zeros(500)))'
+        self.XFunctionString = '(t >= 2)*(t < 5)'
         self.HFunctionString = 'exp(-t)'
+        self.engine = 'auto'
+        # Closed form result when x(t) and h(t) are piecewise exponentials
+        self.analytic = True
+        self.piecesKey = None
+        self.pieces = None
+        # Memory-lean mode : lazy time axes and results written in reused
+        # buffers, optionally with float32 arrays
+        self.lean = False
+        self.dtype = np.dtype(np.float64)
+        self.buffers = {}
+        # Buffers of the computations of the worker thread, swapped with
+        # buffers when adopt takes their result (double buffering)
+        self.spareBuffers = {}
+        # Polled during long computations, see engine.convolve
+        self.cancelled = None
+        # Optional cache of precomputed echos, keyed by stageKey('echos')
+        self.frameCache = None
+        # Optional diskcache.DiskCache of x, h and the result
+        self.diskCache = None
         
         self.makeSafeDict()
+        self.XCode = self.compile(self.XFunctionString)
+        self.HCode = self.compile(self.HFunctionString)
         
     def makeSafeDict(self):
-        self.safe_dict = {'zeros': np.zeros, 'ones': np.ones, 'hstack':np.hstack,
-                'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'exp': np.exp,
-                'arcsin': np.arcsin, 'arccos': np.arccos, 'arctan': np.arctan, 'pi': np.pi,
-                'log' : np.log, 'log10' : np.log10, 'power': np.power, 'sqrt' : np.sqrt
-                }
-        #print(self.safe_dict)
+        self.safe_dict = safeDictionary()
+        
+    def compile(self, stringFunction):
+        return compileExpression(stringFunction, set(self.safe_dict) | {'t'})
+        
+    def stageKey(self, stage):
+        """Inputs a stage depends on, used to match the results of a snapshot."""
+        if stage == 'rangeX':
+            return (self.minrangeX, self.maxrangeX, self.points, self.dtype.name, self.lean)
+        if stage == 'rangeH':
+            return (self.minrangeH, self.maxrangeH, self.points, self.dtype.name, self.lean)
+        if stage == 'x':
+            return (self.XFunctionString, self.stageKey('rangeX'))
+        if stage == 'h':
+            return (self.HFunctionString, self.stageKey('rangeH'))
+        if stage == 'convolution':
+            return (self.stageKey('x'), self.stageKey('h'), self.step, self.engine, self.analytic)
+        return (self.stageKey('x'), self.stageKey('h'), self.step, self.tau, self.echoRate)
+    
+    def needsCompute(self):
+        return any(self.isStale(stage) for stage in HEAVY_STAGES)
+    
+    def snapshot(self, buffers=False):
+        """Copy with its own stages, to be computed on another thread.
+
+        The arrays are shared, they are never modified in place. In lean mode
+        the output buffers are : with buffers the snapshot writes in the
+        spare buffers, which adopt swaps with the ones of the current result.
+        Only one such snapshot may be computed at a time.
+        """
+        other = copy.copy(self)
+        other.stale = set(self.stale)
+        other.versions = dict(self.versions)
+        other.cancelled = None
+        other.buffers = self.spareBuffers if buffers else {}
+        other.spareBuffers = {}
+        return other
+    
+    def checkCancelled(self):
+        if self.cancelled is not None and self.cancelled():
+            raise engine.ComputationCancelled()
+        
+    def compute(self):
+        """Compute all the heavy stages, see snapshot."""
+        self.getXfunction()
+        self.checkCancelled()
+        self.getHfunction()
+        self.checkCancelled()
+        self.getConvolution()
+        
+    def adopt(self, other):
+        """Take the results of a snapshot for the stages whose inputs did not change."""
+        for stage in HEAVY_STAGES:
+            if (self.isStale(stage) and not other.isStale(stage) and
+                    self.stageKey(stage) == other.stageKey(stage)):
+                for name in STAGE_OUTPUTS[stage]:
+                    setattr(self, name, getattr(other, name))
+                self.computed(stage)
+                if stage == 'convolution' and other.buffers is self.spareBuffers:
+                    # The result shown is now in the spare buffers
+                    self.buffers, self.spareBuffers = self.spareBuffers, self.buffers
         
     def getXFunctionString(self):
         return self.XFunctionString
@@ -77,84 +193,340 @@ class Convolution:
     
     def getTau(self):
         return self.tau
+    
+    def getEngine(self):
+        return self.engine
+    
+    def getAnalytic(self):
+        return self.analytic
+    
+    def getLean(self):
+        return self.lean
+    
+    def getDtype(self):
+        return self.dtype
+    
+    def timeAxis(self, start, stop, size):
+        """Same values as np.linspace, computed when needed in lean mode."""
+        if self.lean:
+            return TimeAxis(start, stop, size, self.dtype)
+        return np.linspace(start, stop, size, dtype=self.dtype)
+    
+    def outputBuffer(self, name, size):
+        """Array reused for each computation of an output in lean mode, None otherwise."""
+        if not self.lean:
+            return None
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size != size or buffer.dtype != self.dtype:
+            buffer = self.buffers[name] = np.empty(size, dtype=self.dtype)
+        return buffer
+    
+    def getPoints(self):
+        return self.points
+        
+    def getRangeX(self):
+        if self.isStale('rangeX'):
+            #self.rangeX = np.arange(self.minrangeX, self.maxrangeX, self.step)
+            self.rangeX = self.timeAxis(self.minrangeX, self.maxrangeX, self.points)
+            self.computed('rangeX')
+        return self.rangeX
+    
+    def getRangeH(self):
+        if self.isStale('rangeH'):
+            #self.rangeH = np.arange(self.minrangeH, self.maxrangeH, self.step)
+            self.rangeH = self.timeAxis(self.minrangeH, self.maxrangeH, self.points)
+            self.computed('rangeH')
+        return self.rangeH
+        
+    def cached(self, stage, compute):
+        """Output of stage read from the disk cache if there is one, else computed and stored."""
+        if self.diskCache is None:
+            return compute()
+        key = (stage, self.stageKey(stage))
+        value = self.diskCache.get(key)
+        if value is not None:
+            profiler.count('disk cache hit')
+            return value
+        return self.diskCache.put(key, compute())
         
     def getXfunction(self):
-        self.safe_dict['t'] = self.rangeX
-        self.x = eval(self.XFunctionString, {"__builtins__":None}, self.safe_dict)
+        if self.isStale('x'):
+            self.x = self.cached('x', lambda: sampleExpression(
+                sampleCache, self.XCode, self.XFunctionString, self.safe_dict,
+                self.getRangeX(), self.minrangeX, self.maxrangeX, self.dtype))
+            # The time axis is still needed when x comes from the disk
+            self.getRangeX()
+            self.computed('x')
         return [self.rangeX, self.x]
     
     def getHfunction(self):
-        self.safe_dict['t'] = self.rangeH
-        self.h = eval(self.HFunctionString, {"__builtins__":None}, self.safe_dict)
+        if self.isStale('h'):
+            self.h = self.cached('h', lambda: sampleExpression(
+                sampleCache, self.HCode, self.HFunctionString, self.safe_dict,
+                self.getRangeH(), self.minrangeH, self.maxrangeH, self.dtype))
+            self.getRangeH()
+            self.computed('h')
         return [self.rangeH, self.h]
     
     def getHindex(self, t):
-        try:
-            index = (np.nonzero(t < self.rangeH)[0][0])
-        except IndexError:
+        rangeH = self.getRangeH()
+        index = rangeH.searchsorted(t, side='right')
+        if index >= rangeH.size:
             return []          
         return index
     
     def getConvolution(self):
-        self.result = np.convolve(self.x, self.h)*self.step
-        self.convolveRange = np.linspace(self.minrangeX, self.minrangeX+(self.result.size*self.step), num=self.result.size)
+        if self.isStale('convolution'):
+            self.getXfunction()
+            self.getHfunction()
+            size = self.x.size + self.h.size - 1
+            self.convolveRange = self.timeAxis(self.minrangeX, self.minrangeX+(size*self.step), size)
+            self.result = self.cached('convolution', partial(self.computeConvolution, size))
+            self.computed('convolution')
         return [self.convolveRange, self.result]
+    
+    def computeConvolution(self, size):
+        pieces = self.getClosedForm()
+        # In lean mode the previous result is overwritten
+        out = self.outputBuffer('result', size)
+        with profiler.stage('convolution'):
+            if pieces is not None:
+                profiler.count('analytic convolution')
+                result = analytic.convolvePieces(*pieces, self.convolveRange, out, self.cancelled)
+                return result.astype(self.dtype, copy=False)
+            result = engine.convolve(self.x, self.h, self.engine, self.cancelled,
+                                     self.getKernelSpectrum, out)
+            result *= self.step
+            return result
+    
+    def getPieces(self):
+        """Pieces of x(t) and of h(t) moved to start at 0, see analytic.py.
 
+        None when the closed form is disabled, when an engine is forced with
+        setEngine, when one of the functions is not a piecewise exponential,
+        or when the ranges of x and h have different lengths : h is then
+        sampled with another step than the one of the numeric result and of
+        the echos, and the closed form would not match them.
+        """
+        key = (self.stageKey('x'), self.stageKey('h'), self.analytic, self.engine)
+        if key != self.piecesKey:
+            self.piecesKey = key
+            self.pieces = None
+            sameLength = self.maxrangeX - self.minrangeX == self.maxrangeH - self.minrangeH
+            if self.analytic and self.engine == 'auto' and sameLength:
+                xPieces = analytic.analyzeExpression(self.XFunctionString, self.minrangeX, self.maxrangeX)
+                hPieces = analytic.analyzeExpression(self.HFunctionString, self.minrangeH, self.maxrangeH)
+                if xPieces is not None and hPieces is not None:
+                    self.pieces = (xPieces, analytic.shiftPieces(hPieces, self.minrangeH))
+        return self.pieces
+    
+    def getClosedForm(self):
+        """Pieces of getPieces when the closed form is cheaper than the numeric engine, else None."""
+        pieces = self.getPieces()
+        if pieces is None:
+            return None
+        n, m = self.x.size, self.h.size
+        numeric = engine.estimateCost(engine.chooseEngine(n, m), n, m)
+        if analytic.estimateCost(*pieces, self.convolveRange) > numeric:
+            profiler.count('analytic too costly')
+            return None
+        return pieces
+    
+    def getConvolutionAt(self, t):
+        """Value of the convolution at t, exact when the closed form is available."""
+        pieces = self.getPieces()
+        if pieces is not None:
+            return float(analytic.convolvePieces(*pieces, np.array([t]))[0])
+        data = self.getConvolution()[1]
+        index = int((t-self.minrangeX)/self.step)
+        return data[min(max(index, 0), data.size-1)]
+    
+    def getKernelSpectrum(self, nfft):
+        """rfft of h(t) padded to nfft, reused while h(t) and its range do not change."""
+        self.getHfunction()
+        key = (self.stageKey('h'), nfft)
+        spectrum = spectrumCache.get(key)
+        if spectrum is None:
+            profiler.count('spectrum cache miss')
+            spectrum = np.fft.rfft(self.h, nfft)
+            spectrum.flags.writeable = False
+            spectrumCache.put(key, spectrum)
+        else:
+            profiler.count('spectrum cache hit')
+        return spectrum
 
     def setMinRangeX(self, newmin):
         self.minrangeX = newmin
         self.step = (self.maxrangeX - self.minrangeX)/self.points
-        #self.rangeX = np.arange(self.minrangeX, self.maxrangeX, self.step)        
-        self.rangeX = np.linspace(self.minrangeX, self.maxrangeX, self.points)
+        self.invalidate('rangeX')
         
     def setMinRangeH(self, newmin):
         self.minrangeH = newmin
         self.step = (self.maxrangeH - self.minrangeH)/self.points
-        #self.rangeH = np.arange(self.minrangeH, self.maxrangeH, self.step)
-        self.rangeH = np.linspace(self.minrangeH, self.maxrangeH, self.points)
+        self.invalidate('rangeH')
     
     def setMaxRangeX(self, newmax):
         self.maxrangeX = newmax
         self.step = (self.maxrangeX - self.minrangeX)/self.points
-        #self.rangeX = np.arange(self.minrangeX, self.maxrangeX, self.step)
-        self.rangeX = np.linspace(self.minrangeX, self.maxrangeX, self.points)
+        self.invalidate('rangeX')
         
     def setMaxRangeH(self, newmax):
         self.maxrangeH = newmax
         self.step = (self.maxrangeH - self.minrangeH)/self.points
-        #self.rangeH = np.arange(self.minrangeH, self.maxrangeH, self.step)
-        self.rangeH = np.linspace(self.minrangeH, self.maxrangeH, self.points)
+        self.invalidate('rangeH')
         
     def setRangeX(self, newmin, newmax):
         self.minrangeX = newmin
         self.maxrangeX = newmax
         self.step = (self.maxrangeX - self.minrangeX)/self.points
-        #self.rangeX = np.arange(self.minrangeX, self.maxrangeX, self.step)
-        self.rangeX = np.linspace(self.minrangeX, self.maxrangeX, self.points)
+        self.invalidate('rangeX')
         
     def setRangeH(self, newmin, newmax):
         self.minrangeH = newmin
         self.maxrangeH = newmax
         self.step = (self.maxrangeH - self.minrangeH)/self.points
-        #self.rangeH = np.arange(self.minrangeH, self.maxrangeH, self.step)
-        self.rangeH = np.linspace(self.minrangeH, self.maxrangeH, self.points)
+        self.invalidate('rangeH')
+        
+    def setEngine(self, method):
+        if method not in engine.ENGINES:
+            raise ValueError("Unknown convolution engine '{}'".format(method))
+        if method != self.engine:
+            self.engine = method
+            self.invalidate('convolution')
+        
+    def setAnalytic(self, enabled):
+        if enabled != self.analytic:
+            self.analytic = enabled
+            self.invalidate('convolution')
+        
+    def setLean(self, lean):
+        if lean != self.lean:
+            self.lean = lean
+            self.buffers = {}
+            self.spareBuffers = {}
+            self.invalidate('rangeX')
+            self.invalidate('rangeH')
+            
+    def setDtype(self, dtype):
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError("Unsupported dtype '{}', float32 or float64 expected".format(dtype))
+        if dtype != self.dtype:
+            self.dtype = dtype
+            self.invalidate('rangeX')
+            self.invalidate('rangeH')
+        
+    def getBatchConvolution(self, xStack, hStack=None):
+        """Convolutions of every row of xStack with h(t), or with the rows of hStack.
+
+        Returns the common time axis and the 2-D array of the results.
+        """
+        spectrum = None
+        if hStack is None:
+            hStack = self.getHfunction()[1]
+            spectrum = self.getKernelSpectrum
+        results = engine.batchConvolve(xStack, hStack, spectrum=spectrum)*self.step
+        size = results.shape[1]
+        convolveRange = self.timeAxis(self.minrangeX, self.minrangeX+(size*self.step), size)
+        return [convolveRange, results]
+        
+    def getStreamConvolution(self, source, output, blockSize=streaming.READ_BLOCK, length=None):
+        """Convolution of a large x read from source with h, see streaming.streamConvolve."""
+        return streaming.streamConvolve(source, self.getHfunction()[1], output, self.step,
+                                        blockSize, length=length, cancelled=self.cancelled)
+        
+    def validateEngine(self, rtol=1e-7, atol=1e-9):
+        self.getXfunction()
+        self.getHfunction()
+        return engine.validateEngine(self.x, self.h, self.engine, rtol, atol)*self.step
+        
+    def setPoints(self, points):
+        points = int(points)
+        if points < 2:
+            raise ValueError("At least 2 points are needed, got {}".format(points))
+        if points != self.points:
+            self.points = points
+            self.step = (self.maxrangeX - self.minrangeX)/self.points
+            self.echoPoints = max(int(self.points/self.echoRate), 1)
+            self.invalidate('rangeX')
+            self.invalidate('rangeH')
+        
+    def getSettings(self):
+        """Inputs of the convolution, restored by applySettings."""
+        return {'XFunction': self.XFunctionString, 'HFunction': self.HFunctionString,
+                'minRangeX': self.minrangeX, 'maxRangeX': self.maxrangeX,
+                'minRangeH': self.minrangeH, 'maxRangeH': self.maxrangeH,
+                'points': self.points, 'tau': self.tau, 'echoRate': self.echoRate,
+                'engine': self.engine, 'analytic': self.analytic,
+                'lean': self.lean, 'dtype': self.dtype.name}
+    
+    def applySettings(self, settings):
+        """Set the inputs given in settings, only the changed ones are invalidated."""
+        if 'lean' in settings:
+            self.setLean(settings['lean'])
+        if 'dtype' in settings:
+            self.setDtype(settings['dtype'])
+        self.applyInputs(settings)
+        if 'analytic' in settings:
+            self.setAnalytic(settings['analytic'])
+        if 'tau' in settings:
+            self.setTau(settings['tau'])
+        if settings.get('echoRate', self.echoRate) != self.echoRate:
+            self.setEchoRate(settings['echoRate'])
         
     def setTau(self, tau):
-        self.tau = tau
+        if tau != self.tau:
+            self.tau = tau
+            self.invalidate('echos')
         
     def setEchoRate(self, echoRate):
         self.echoRate = echoRate
-        self.echoPoints = int(self.points/self.echoRate)
-        
-    def setXFunction(self, stringFunction):
-        self.XFunctionString = stringFunction
-        
-    def setHFunction(self, stringFunction):
-        self.HFunctionString = stringFunction
+        self.echoPoints = max(int(self.points/self.echoRate), 1)
+        self.invalidate('echos')
         
     def createEchos(self):
-        numberOfEchos = np.floor((self.tau-self.minrangeX)/(self.step*self.echoPoints))
-        self.echos = [self.tau - echo*(self.step*self.echoPoints) for echo in np.arange(0,numberOfEchos)]
-        return self.echos
-        
-        
\ No newline at end of file
+        return self.getEchoProducts()['echos']
+    
+    def getEchoProducts(self):
+        """All the echos for the current tau in one vectorized pass.
+
+        Returns a dictionary of arrays : the echo positions, their indices in
+        x and h, the products x*h at each echo (0 when outside of the
+        vectors), the mask of the echos drawn (positive products), and the
+        partial and total Riemann sums of the products.
+        """
+        if self.isStale('echos') and self.frameCache is not None:
+            frame = self.frameCache.get(self.stageKey('echos'))
+            if frame is not None:
+                profiler.count('frame cache hit')
+                self.echoProducts = frame
+                self.echos = frame['echos']
+                self.computed('echos')
+        if self.isStale('echos'):
+            with profiler.stage('echos'):
+                x = self.getXfunction()[1]
+                rangeH, h = self.getHfunction()
+                deltaTau = self.step*self.echoPoints
+                numberOfEchos = max(int(np.floor((self.tau-self.minrangeX)/deltaTau)), 0)
+                echos = self.tau - np.arange(numberOfEchos)*deltaTau
+                self.echos = echos
+            
+                xIndex = np.arange(numberOfEchos)*self.echoPoints
+                hIndex = rangeH.searchsorted(echos-self.minrangeX+self.minrangeH, side='right')
+                inside = (xIndex < x.size) & (hIndex < h.size)
+                intersections = np.zeros(numberOfEchos)
+                intersections[inside] = x[xIndex[inside]]*h[hIndex[inside]]
+                visible = intersections > 0
+            
+                tauIndex = int(((self.tau-self.minrangeX)/self.step))
+                xTau = x[min(max(tauIndex, 0), x.size-1)]
+                # Sum of the first n echos, the last one is the total
+                partialSums = (h[0]*xTau + np.cumsum(intersections[visible]))*deltaTau
+                total = partialSums[-1] if partialSums.size else h[0]*xTau*deltaTau
+                self.echoProducts = {'tau': self.tau, 'echos': echos, 'xIndex': xIndex, 'hIndex': hIndex,
+                                     'intersections': intersections, 'visible': visible,
+                                     'tauIndex': tauIndex, 'xTau': xTau,
+                                     'deltaTau': deltaTau, 'partialSums': partialSums,
+                                     'total': total}
+            self.computed('echos')
+        return self.echoProducts
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convolution of two images x(u, v) and h(u, v), the 2-D counterpart of the
+Convolution class.
+
+The expressions use the same safe names as in 1-D, with u and v instead of
+t, and are evaluated on a grid. Both images share the same step so the
+result is the convolution integral sampled on the grid. The probe point
+plays the role of tau : the products x(s)h(p-s) around it sum to the value
+of the result at p.
+
+Convolution de deux images, avec un point de sonde analogue à tau.
+
+License : GPL 3
+"""
+
+import numpy as np
+
+import engine
+from convolution import sampleCache
+from expression import compileExpression, safeDictionary, sampleGrid
+from profiling import profiler
+from stages import StagedComputation
+
+STAGES_2D = {'gridX': ('x',),
+             'gridH': ('h',),
+             'x': ('convolution',),
+             'h': ('convolution', 'separable'),
+             'convolution': ('probe',),
+             'separable': (),
+             'probe': (),
+             }
+
+MAX_POINTS_2D = 2000
+
+
+class Convolution2D(StagedComputation):
+    STAGES = STAGES_2D
+    PROFILE_NAME = 'recompute 2d '
+
+    def __init__(self):
+        super().__init__()
+        self.minrangeX = -5
+        self.maxrangeX = 5
+        self.minrangeH = -2
+        self.maxrangeH = 2
+        self.points = 201
+        self.step = (self.maxrangeX - self.minrangeX)/(self.points - 1)
+        self.probe = (0.0, 0.0)
+        self.XFunctionString = '(abs(u) < 2)*(abs(v) < 1)'
+        self.HFunctionString = 'exp(-(u**2+v**2))'
+        self.engine = 'auto'
+
+        self.makeSafeDict()
+        self.XCode = self.compile(self.XFunctionString)
+        self.HCode = self.compile(self.HFunctionString)
+
+    def makeSafeDict(self):
+        self.safe_dict = safeDictionary()
+        self.safe_dict['abs'] = np.abs
+
+    def compile(self, stringFunction):
+        return compileExpression(stringFunction, set(self.safe_dict) | {'u', 'v'})
+
+    def getXFunctionString(self):
+        return self.XFunctionString
+
+    def getHFunctionString(self):
+        return self.HFunctionString
+
+    def getMinRangeX(self):
+        return self.minrangeX
+
+    def getMaxRangeX(self):
+        return self.maxrangeX
+
+    def getMinRangeH(self):
+        return self.minrangeH
+
+    def getMaxRangeH(self):
+        return self.maxrangeH
+
+    def getPoints(self):
+        return self.points
+
+    def getStep(self):
+        return self.step
+
+    def getProbe(self):
+        return self.probe
+
+    def getEngine(self):
+        return self.engine
+
+    def grid(self, minimum, size):
+        axis = minimum + np.arange(size)*self.step
+        return np.meshgrid(axis, axis, sparse=True)
+
+    def getGridX(self):
+        if self.isStale('gridX'):
+            self.gridX = self.grid(self.minrangeX, self.points)
+            self.computed('gridX')
+        return self.gridX
+
+    def getGridH(self):
+        # h is sampled with the step of x, its size follows from its range
+        if self.isStale('gridH'):
+            size = max(int(round((self.maxrangeH - self.minrangeH)/self.step)) + 1, 1)
+            self.gridH = self.grid(self.minrangeH, size)
+            self.computed('gridH')
+        return self.gridH
+
+    def getXfunction(self):
+        if self.isStale('x'):
+            u, v = self.getGridX()
+            self.x = sampleGrid(sampleCache, self.XCode, self.XFunctionString, self.safe_dict, u, v)
+            self.computed('x')
+        return [self.gridX[0], self.gridX[1], self.x]
+
+    def getHfunction(self):
+        if self.isStale('h'):
+            u, v = self.getGridH()
+            self.h = sampleGrid(sampleCache, self.HCode, self.HFunctionString, self.safe_dict, u, v)
+            self.computed('h')
+        return [self.gridH[0], self.gridH[1], self.h]
+
+    def isSeparable(self):
+        if self.isStale('separable'):
+            self.separable = engine.separateKernel(self.getHfunction()[2]) is not None
+            self.computed('separable')
+        return self.separable
+
+    def getConvolution(self):
+        """Axes u, v and image of the convolution, starting at minrangeX+minrangeH."""
+        if self.isStale('convolution'):
+            x = self.getXfunction()[2]
+            h = self.getHfunction()[2]
+            with profiler.stage('convolution 2d'):
+                self.result = engine.convolve2d(x, h, self.engine)*self.step**2
+            self.convolveGrid = self.grid(self.minrangeX + self.minrangeH, self.result.shape[0])
+            self.computed('convolution')
+        return [self.convolveGrid[0], self.convolveGrid[1], self.result]
+
+    def setRangeX(self, newmin, newmax):
+        if newmax <= newmin:
+            raise ValueError("The range of x is empty : [{}, {}]".format(newmin, newmax))
+        self.minrangeX = newmin
+        self.maxrangeX = newmax
+        self.step = (self.maxrangeX - self.minrangeX)/(self.points - 1)
+        self.invalidate('gridX')
+        self.invalidate('gridH')
+
+    def setRangeH(self, newmin, newmax):
+        if newmax < newmin:
+            raise ValueError("The range of h is empty : [{}, {}]".format(newmin, newmax))
+        self.minrangeH = newmin
+        self.maxrangeH = newmax
+        self.invalidate('gridH')
+
+    def setPoints(self, points):
+        points = int(points)
+        if not 2 <= points <= MAX_POINTS_2D:
+            raise ValueError("Between 2 and {} points are needed, got {}".format(MAX_POINTS_2D, points))
+        if points != self.points:
+            self.points = points
+            self.step = (self.maxrangeX - self.minrangeX)/(self.points - 1)
+            self.invalidate('gridX')
+            self.invalidate('gridH')
+
+    def setEngine(self, method):
+        if method not in engine.ENGINES_2D:
+            raise ValueError("Unknown 2-D convolution engine '{}'".format(method))
+        if method != self.engine:
+            self.engine = method
+            self.invalidate('convolution')
+
+    def setProbe(self, u, v):
+        if (u, v) != self.probe:
+            self.probe = (u, v)
+            self.invalidate('probe')
+
+    def getSettings(self):
+        return {'XFunction': self.XFunctionString, 'HFunction': self.HFunctionString,
+                'minRangeX': self.minrangeX, 'maxRangeX': self.maxrangeX,
+                'minRangeH': self.minrangeH, 'maxRangeH': self.maxrangeH,
+                'points': self.points, 'probe': self.probe, 'engine': self.engine}
+
+    def applySettings(self, settings):
+        self.applyInputs(settings)
+        if 'probe' in settings:
+            self.setProbe(*settings['probe'])
+
+    def getProbeProducts(self):
+        """Products x(s)h(p-s) for the probe point p, over the part of x seen by h.
+
+        Returns a dictionary with the probe indices in the result, the value
+        of the result there, the products image with its extent in s, and
+        their sum times the area of a pixel.
+        """
+        if self.isStale('probe'):
+            x = self.getXfunction()[2]
+            h = self.getHfunction()[2]
+            result = self.getConvolution()[2]
+            origin = self.minrangeX + self.minrangeH
+            index = [min(max(int(round((coordinate - origin)/self.step)), 0), size - 1)
+                     for coordinate, size in zip(self.probe, result.shape[::-1])]
+            # (row, column) in the images, v is the row
+            n = index[::-1]
+            first = [max(0, n[axis] - (h.shape[axis] - 1)) for axis in (0, 1)]
+            last = [min(x.shape[axis] - 1, n[axis]) for axis in (0, 1)]
+            flipped = h[::-1, ::-1]
+            start = [h.shape[axis] - 1 - n[axis] + first[axis] for axis in (0, 1)]
+            stop = [h.shape[axis] - 1 - n[axis] + last[axis] + 1 for axis in (0, 1)]
+            products = (x[first[0]:last[0]+1, first[1]:last[1]+1] *
+                        flipped[start[0]:stop[0], start[1]:stop[1]])
+            extent = (self.minrangeX + (first[1] - 0.5)*self.step, self.minrangeX + (last[1] + 0.5)*self.step,
+                      self.minrangeX + (first[0] - 0.5)*self.step, self.minrangeX + (last[0] + 0.5)*self.step)
+            self.probeProducts = {'probe': self.probe, 'index': tuple(n), 'value': result[n[0], n[1]],
+                                  'products': products, 'extent': extent,
+                                  'total': products.sum()*self.step**2}
+            self.computed('probe')
+        return self.probeProducts
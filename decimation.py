@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reduction of the number of points sent to matplotlib.
+
+The computations keep every point, only the curves drawn are decimated to
+about one or two points per pixel of the canvas. Both methods return the
+indices of the points kept, so several curves sharing a time axis (such as
+the echos of h) can use the same selection.
+
+Réduction du nombre de points affichés.
+
+License : GPL 3
+"""
+
+import numpy as np
+
+
+def minMaxIndices(y, buckets):
+    """Indices of the minimum and maximum of y in each of buckets slices.
+
+    The envelope of the curve is kept exactly, with at most 2*buckets+2
+    points.
+    """
+    y = np.asarray(y)
+    n = y.size
+    if buckets < 1 or n <= 2*buckets + 2:
+        return np.arange(n)
+    # Rounded up, a partial last bucket then replaces a full one
+    size = -(-n // buckets)
+    count = n // size
+    full = count*size
+    blocks = y[:full].reshape(count, size)
+    offsets = np.arange(count)*size
+    indices = [np.sort(np.column_stack((offsets + np.argmin(blocks, axis=1),
+                                        offsets + np.argmax(blocks, axis=1))), axis=1).ravel()]
+    if full < n:
+        tail = y[full:]
+        indices.append(np.sort([full + np.argmin(tail), full + np.argmax(tail)]))
+    indices = np.concatenate([[0]] + indices + [[n-1]])
+    # Flat buckets give the same index twice
+    return indices[np.r_[True, np.diff(indices) != 0]]
+
+
+def lttbIndices(t, y, threshold):
+    """Largest-Triangle-Three-Buckets selection of threshold points.
+
+    Keeps the visual shape of the curve with exactly threshold points, at
+    the cost of a loop over the buckets.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = y.size
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+    edges = np.linspace(1, n-1, threshold-1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n-1
+    previous = 0
+    for bucket in range(threshold-2):
+        start, stop = edges[bucket], edges[bucket+1]
+        nextStart, nextStop = stop, edges[bucket+2] if bucket+2 < edges.size else n
+        if nextStop <= nextStart:
+            nextStop = nextStart + 1
+        meanT = t[nextStart:nextStop].mean()
+        meanY = y[nextStart:nextStop].mean()
+        areas = np.abs((t[previous] - meanT)*(y[start:stop] - y[previous]) -
+                       (t[previous] - t[start:stop])*(meanY - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket+1] = previous
+    return indices
+
+
+def decimate(t, y, pixels, method='minmax'):
+    """Curve t, y reduced for a canvas pixels wide."""
+    if method == 'lttb':
+        indices = lttbIndices(t, y, 2*pixels)
+    else:
+        indices = minMaxIndices(y, pixels)
+    # Indexing a lazy time axis only computes the times kept, see timeaxis.py
+    return t[indices], np.asarray(y)[indices]
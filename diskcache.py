@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of NumPy arrays, addressed by a hash of their inputs.
+
+Each array is a .npy file named after the SHA-256 of its key and read back
+memory-mapped, so reopening a large case maps the stored result instead of
+computing it again. The total size of the files is bounded, the least
+recently used ones are removed first (their modification time is updated
+on each read).
+
+Cache sur disque des tableaux NumPy, en fichiers .npy projetés en mémoire.
+
+License : GPL 3
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from threading import Lock
+
+import numpy as np
+
+DISK_CACHE_BYTES = 2*2**30
+# Smaller arrays are faster to compute again than to write
+DISK_CACHE_MIN_BYTES = 2**20
+
+
+def cacheDirectory():
+    """Directory of the files of the application, in the user cache directory."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ConstructionConvolution')
+
+
+def normalize(value):
+    """value with its numbers as floats, 0 and 0.0 give the same text in json."""
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def keyDigest(key):
+    text = json.dumps(normalize(key), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, directory=None, maxBytes=DISK_CACHE_BYTES, minBytes=DISK_CACHE_MIN_BYTES):
+        self.directory = directory or os.path.join(cacheDirectory(), 'arrays')
+        self.maxBytes = maxBytes
+        self.minBytes = minBytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, keyDigest(key) + '.npy')
+
+    def get(self, key, default=None):
+        """Read-only memory-mapped array of key, or default."""
+        path = self.path(key)
+        with self.lock:
+            try:
+                value = np.load(path, mmap_mode='r', allow_pickle=False)
+                os.utime(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        array = np.asarray(value)
+        # Object arrays are not stored, they would need pickle to be read
+        if array.nbytes < self.minBytes or array.nbytes > self.maxBytes or array.dtype.hasobject:
+            return value
+        path = self.path(key)
+        with self.lock:
+            # Written to a temporary file first, a reader never sees half a file
+            handle, temporary = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(handle, 'wb') as output:
+                    np.save(output, array)
+                os.replace(temporary, path)
+            except OSError:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                return value
+            self.evict()
+        return value
+
+    def files(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.files())
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Still mapped on systems that lock open files
+                continue
+            total -= size
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def __len__(self):
+        return len(self.files())
+
+    def size(self):
+        return sum(size for mtime, size, path in self.files())
+
+    def clear(self):
+        with self.lock:
+            for mtime, size, path in self.files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
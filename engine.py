@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convolution engines used by the Convolution class.
+
+Three methods are available : the direct method (np.convolve), a single FFT
+of the padded signals and overlap-add by blocks. The 'auto' method estimates
+the cost of each one from the sizes of x and h and picks the cheapest.
+
+Les moteurs de calcul de la convolution : directe, par FFT et par
+chevauchement-addition (overlap-add).
+
+License : GPL 3
+"""
+
+import numpy as np
+
+ENGINES = ('auto', 'direct', 'fft', 'overlap-add')
+
+# Below this many multiplications the direct method always wins, the FFT
+# overhead dominates.
+DIRECT_THRESHOLD = 50000
+# Python overhead of one overlap-add block, in equivalent operations
+BLOCK_OVERHEAD = 1e5
+
+
+class ComputationCancelled(Exception):
+    pass
+
+
+def fastLength(n):
+    """Smallest 5-smooth integer (2^a 3^b 5^c) greater or equal to n."""
+    if n <= 16:
+        return max(int(n), 1)
+    best = 2**int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p2 = p35
+            while p2 < n:
+                p2 *= 2
+            best = min(best, p2)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def blockSize(kernelSize):
+    """Block length for overlap-add, chosen so the FFT size is about 8 times h."""
+    nfft = fastLength(8*kernelSize)
+    return max(nfft - kernelSize + 1, kernelSize)
+
+
+def estimateCost(method, n, m):
+    """Rough number of floating point operations of a method for sizes n and m."""
+    if method == 'direct':
+        return float(n)*m
+    if method == 'fft':
+        nfft = fastLength(n + m - 1)
+        return 3*2.5*nfft*np.log2(nfft) + nfft
+    if method == 'overlap-add':
+        small = min(n, m)
+        block = blockSize(small)
+        nfft = fastLength(block + small - 1)
+        blocks = np.ceil(max(n, m)/float(block))
+        return blocks*(2*2.5*nfft*np.log2(nfft) + nfft + BLOCK_OVERHEAD) + 2.5*nfft*np.log2(nfft)
+    raise ValueError("Unknown convolution engine '{}'".format(method))
+
+
+def chooseEngine(n, m):
+    if n == 0 or m == 0 or float(n)*m <= DIRECT_THRESHOLD:
+        return 'direct'
+    costs = {method: estimateCost(method, n, m) for method in ('direct', 'fft', 'overlap-add')}
+    return min(costs, key=costs.get)
+
+
+def directConvolve(x, h):
+    return np.convolve(x, h)
+
+
+def kernelTransform(h, nfft, spectrum=None):
+    """rfft of h padded to nfft, from the spectrum callable when one is given."""
+    if spectrum is not None:
+        return spectrum(nfft)
+    return np.fft.rfft(h, nfft)
+
+
+def fftConvolve(x, h, spectrum=None):
+    size = x.size + h.size - 1
+    nfft = fastLength(size)
+    spectrum = np.fft.rfft(x, nfft)*kernelTransform(h, nfft, spectrum)
+    return np.fft.irfft(spectrum, nfft)[:size]
+
+
+class BlockConvolver:
+    """Overlap-add convolution with h of a signal given block by block.
+
+    Only the last h.size-1 samples of output are kept between blocks.
+    """
+    def __init__(self, h, block=None, spectrum=None):
+        self.kernelSize = h.size
+        self.block = block or blockSize(h.size)
+        self.nfft = fastLength(self.block + h.size - 1)
+        self.kernel = kernelTransform(h, self.nfft, spectrum)
+        self.dtype = floatType(h)
+        self.tail = np.zeros(h.size - 1, dtype=self.dtype)
+        
+    def process(self, segment):
+        """Convolve the next samples, returns as many finished output samples."""
+        segment = np.asarray(segment, dtype=self.dtype)
+        output = np.empty(segment.size, dtype=self.dtype)
+        for start in range(0, segment.size, self.block):
+            part = segment[start:start+self.block]
+            result = np.fft.irfft(np.fft.rfft(part, self.nfft)*self.kernel, self.nfft)[:part.size+self.kernelSize-1]
+            result[:self.tail.size] += self.tail
+            output[start:start+part.size] = result[:part.size]
+            self.tail = result[part.size:]
+        return output
+    
+    def flush(self):
+        """Last h.size-1 samples of the output, once the signal is over."""
+        tail = self.tail
+        self.tail = np.zeros(self.kernelSize - 1, dtype=self.dtype)
+        return tail
+
+
+def overlapAddConvolve(x, h, block=None, cancelled=None, spectrum=None, out=None):
+    # The longer signal is cut in blocks, the shorter one is the kernel
+    if x.size < h.size:
+        x, h = h, x
+        spectrum = None
+    convolver = BlockConvolver(h, block, spectrum)
+    result = out if out is not None else np.empty(x.size + h.size - 1, dtype=convolver.dtype)
+    for start in range(0, x.size, convolver.block):
+        if cancelled is not None and cancelled():
+            raise ComputationCancelled()
+        stop = min(start + convolver.block, x.size)
+        result[start:stop] = convolver.process(x[start:stop])
+    result[x.size:] = convolver.flush()
+    return result
+
+
+def floatType(*arrays):
+    """float32 when all the arrays are float32, float64 otherwise."""
+    return np.result_type(*arrays, np.float32)
+
+
+def convolve(x, h, method='auto', cancelled=None, spectrum=None, out=None):
+    """Full discrete convolution of x and h, same output as np.convolve.
+
+    cancelled is an optional callable polled between blocks, the computation
+    raises ComputationCancelled when it returns True. spectrum is an optional
+    callable returning the rfft of h padded to a given size, so the transform
+    of a kernel that did not change can be reused. The result is written in
+    out when given. float32 signals are convolved in float32.
+    """
+    x = np.asarray(x)
+    h = np.asarray(h)
+    dtype = floatType(x, h)
+    x = x.astype(dtype, copy=False)
+    h = h.astype(dtype, copy=False)
+    if method == 'auto':
+        method = chooseEngine(x.size, h.size)
+    if method == 'overlap-add':
+        return overlapAddConvolve(x, h, cancelled=cancelled, spectrum=spectrum, out=out)
+    if method == 'direct':
+        result = directConvolve(x, h)
+    elif method == 'fft':
+        result = fftConvolve(x, h, spectrum)
+    else:
+        raise ValueError("Unknown convolution engine '{}'".format(method))
+    if out is None:
+        return result
+    out[...] = result
+    return out
+
+
+def batchConvolve(xs, hs, maxElements=2**24, spectrum=None):
+    """Convolution of each row of xs with h, or with the matching row of hs.
+
+    All the rows go through one FFT along the last axis. A single kernel is
+    transformed once and shared by every row. Rows are processed in chunks
+    of at most maxElements spectrum values to bound the memory used.
+    float32 signals are convolved in float32.
+    """
+    xs = np.atleast_2d(np.asarray(xs))
+    hs = np.asarray(hs)
+    # float32 rows give float32 results, as in convolve
+    dtype = floatType(xs, hs)
+    xs = xs.astype(dtype, copy=False)
+    hs = hs.astype(dtype, copy=False)
+    if hs.ndim == 2 and hs.shape[0] != xs.shape[0]:
+        raise ValueError("{} kernels for {} signals".format(hs.shape[0], xs.shape[0]))
+    size = xs.shape[1] + hs.shape[-1] - 1
+    nfft = fastLength(size)
+    sharedKernel = kernelTransform(hs, nfft, spectrum) if hs.ndim == 1 else None
+    result = np.empty((xs.shape[0], size), dtype=dtype)
+    rows = max(maxElements//nfft, 1)
+    for start in range(0, xs.shape[0], rows):
+        stop = start + rows
+        kernel = sharedKernel if sharedKernel is not None else np.fft.rfft(hs[start:stop], nfft, axis=-1)
+        spectrum = np.fft.rfft(xs[start:stop], nfft, axis=-1)*kernel
+        result[start:stop] = np.fft.irfft(spectrum, nfft, axis=-1)[:, :size]
+    return result
+
+
+def validateEngine(x, h, method, rtol=1e-7, atol=1e-9):
+    """Compare an engine with the direct method, returns the maximum absolute error.
+
+    Raises AssertionError if the difference is outside the tolerance.
+    """
+    reference = directConvolve(np.asarray(x, dtype=float), np.asarray(h, dtype=float))
+    result = convolve(x, h, method)
+    scale = np.max(np.abs(reference)) if reference.size else 0
+    error = np.max(np.abs(result - reference)) if reference.size else 0
+    if error > atol + rtol*scale:
+        raise AssertionError("Engine '{}' differs from direct convolution by {}".format(method, error))
+    return error
+
+
+ENGINES_2D = ('auto', 'fft', 'separable')
+
+
+def separateKernel(h, rtol=1e-9):
+    """Column and row vectors whose outer product is h, None if h is not separable.
+
+    A rank one matrix is the outer product of any of its non zero columns and
+    rows, so the largest element gives the candidate, checked in O(size).
+    """
+    h = np.asarray(h)
+    if h.size == 0:
+        return None
+    i, j = np.unravel_index(np.argmax(np.abs(h)), h.shape)
+    pivot = h[i, j]
+    if pivot == 0:
+        return np.zeros(h.shape[0], dtype=h.dtype), np.zeros(h.shape[1], dtype=h.dtype)
+    column = h[:, j]/pivot
+    row = h[i, :]
+    if not np.allclose(np.outer(column, row), h, rtol=rtol, atol=rtol*abs(pivot)):
+        return None
+    return column, row
+
+
+def fftConvolve2d(x, h):
+    shape = [fastLength(x.shape[axis] + h.shape[axis] - 1) for axis in (0, 1)]
+    size = [x.shape[axis] + h.shape[axis] - 1 for axis in (0, 1)]
+    spectrum = np.fft.rfft2(x, shape)*np.fft.rfft2(h, shape)
+    return np.fft.irfft2(spectrum, shape)[:size[0], :size[1]]
+
+
+def separableConvolve2d(x, column, row):
+    """Convolution with the kernel outer(column, row) as two passes of 1-D convolutions."""
+    rows = batchConvolve(x, row)
+    return batchConvolve(rows.T, column).T
+
+
+def convolve2d(x, h, method='auto'):
+    """Full 2-D convolution of the images x and h.
+
+    'auto' uses two 1-D passes when h is separable and a 2-D FFT otherwise.
+    """
+    x = np.asarray(x)
+    h = np.asarray(h)
+    dtype = floatType(x, h)
+    x = x.astype(dtype, copy=False)
+    h = h.astype(dtype, copy=False)
+    if method not in ENGINES_2D:
+        raise ValueError("Unknown 2-D convolution engine '{}'".format(method))
+    if method != 'fft':
+        factors = separateKernel(h)
+        if factors is not None:
+            return separableConvolve2d(x, *factors)
+        if method == 'separable':
+            raise ValueError("The kernel is not separable")
+    return fftConvolve2d(x, h)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parsing and evaluation of the x(t) and h(t) expressions, and of the x(u, v)
+and h(u, v) images of the 2-D mode.
+
+An expression is checked once against the names of the safe dictionary and
+compiled to a code object. Sampled arrays are kept in an LRU cache keyed by
+(expression, range, points).
+
+Analyse et évaluation des expressions x(t) et h(t).
+
+License : GPL 3
+"""
+
+import ast
+
+import numpy as np
+
+from profiling import profiler
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def safeDictionary():
+    """Names allowed in the expressions, besides the variables."""
+    return {'zeros': np.zeros, 'ones': np.ones, 'hstack':np.hstack,
+            'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'exp': np.exp,
+            'arcsin': np.arcsin, 'arccos': np.arccos, 'arctan': np.arctan, 'pi': np.pi,
+            'log' : np.log, 'log10' : np.log10, 'power': np.power, 'sqrt' : np.sqrt
+            }
+
+
+def compileExpression(source, names):
+    """Validate an expression against the allowed names and compile it.
+
+    Raises ExpressionError for syntax errors, attribute access and names
+    that are not in names.
+    """
+    if not isinstance(source, str):
+        raise ExpressionError("An expression must be a string, got {!r}".format(source))
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as error:
+        raise ExpressionError("Invalid syntax in '{}': {}".format(source, error.msg))
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Attribute, ast.Lambda, ast.NamedExpr)):
+            raise ExpressionError("'{}' is not allowed in an expression".format(ast.unparse(node)))
+        if isinstance(node, ast.Name) and node.id not in names:
+            raise ExpressionError("Unknown name '{}' in '{}'".format(node.id, source))
+    return compile(tree, '<expression>', 'eval')
+
+
+def runExpression(code, safe_dict, variables):
+    namespace = dict(safe_dict)
+    namespace.update(variables)
+    try:
+        return eval(code, {"__builtins__":None}, namespace)
+    except Exception as error:
+        raise ExpressionError(str(error))
+
+
+def evaluateExpression(code, safe_dict, t, dtype=float):
+    """Evaluate a compiled expression on the time vector t."""
+    value = np.asarray(runExpression(code, safe_dict, {'t': t}), dtype=dtype)
+    if value.ndim == 0:
+        value = np.full(t.shape, value, dtype=dtype)
+    if value.shape != t.shape:
+        raise ExpressionError("Expression gives {} points, {} expected".format(value.size, t.size))
+    return value
+
+
+def sampleExpression(cache, code, source, safe_dict, t, minimum, maximum, dtype=float):
+    """Evaluated expression on t, from the cache if available.
+
+    t may be a lazy time axis, it is only built when the cache has no value.
+    The returned array is read-only since it may be shared through the cache.
+    """
+    key = (source, minimum, maximum, t.size, np.dtype(dtype).name)
+    value = cache.get(key)
+    if value is None:
+        profiler.count('sample cache miss')
+        with profiler.stage('eval'):
+            value = evaluateExpression(code, safe_dict, np.asarray(t), dtype)
+        value.flags.writeable = False
+        cache.put(key, value)
+    else:
+        profiler.count('sample cache hit')
+    return value
+
+
+def evaluateGrid(code, safe_dict, u, v, dtype=float):
+    """Evaluate a compiled expression of u and v on a grid.
+
+    u is a row and v a column, as given by np.meshgrid with sparse=True, so
+    an expression of u only is broadcast to the whole image.
+    """
+    shape = (v.size, u.size)
+    value = np.asarray(runExpression(code, safe_dict, {'u': u, 'v': v}), dtype=dtype)
+    try:
+        return np.array(np.broadcast_to(value, shape))
+    except ValueError:
+        raise ExpressionError("Expression gives an array of shape {}, {} expected".format(value.shape, shape))
+
+
+def sampleGrid(cache, code, source, safe_dict, u, v, dtype=float):
+    """Evaluated expression on the grid u, v, from the cache if available."""
+    key = (source, u[0, 0], u[0, -1], v[0, 0], v[-1, 0], u.size, v.size, np.dtype(dtype).name)
+    value = cache.get(key)
+    if value is None:
+        profiler.count('sample cache miss')
+        with profiler.stage('eval'):
+            value = evaluateGrid(code, safe_dict, u, v, dtype)
+        value.flags.writeable = False
+        cache.put(key, value)
+    else:
+        profiler.count('sample cache hit')
+    return value
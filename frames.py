@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Precomputed frames of the tau animation.
+
+The echos of every tau of the slider are computed in the background and
+kept in a memory bounded LRU cache, under the key Convolution.getEchoProducts
+looks up. Moving the slider back and forth then only reads the cache. The
+products panel can also be rendered offscreen for every tau, optionally in
+the background too with a FrameRaster, and the images written to a GIF or
+a video. A rendered frame keeps its image under 'raster', with the
+'rasterKey' of the panel it was drawn for.
+
+Images de l'animation en tau, calculées à l'avance.
+
+License : GPL 3
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cache import LRUCache
+
+FRAME_CACHE_BYTES = 256*2**20
+
+
+class FrameCache(LRUCache):
+    def __init__(self, maxBytes=FRAME_CACHE_BYTES):
+        super().__init__(maxBytes)
+
+
+def computeFrame(convolution, tau):
+    """Echos of convolution for another tau, the convolution is not modified."""
+    snapshot = convolution.snapshot()
+    snapshot.setTau(tau)
+    return snapshot.stageKey('echos'), snapshot.getEchoProducts()
+
+
+class FramePrecomputer:
+    def __init__(self, cache):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.generation = 0
+        self.future = None
+        
+    def start(self, convolution, taus, raster=None):
+        """Compute the frames of taus, the closest to the current tau first.
+
+        raster is an optional FrameRaster, the image of each frame is then
+        rendered on the thread of the precomputer.
+        """
+        self.cancel()
+        generation = self.generation
+        tau = convolution.getTau()
+        taus = sorted(taus, key=lambda other: abs(other - tau))
+        self.future = self.executor.submit(self.run, generation, convolution.snapshot(), taus, raster)
+        
+    def run(self, generation, convolution, taus, raster):
+        # x, h and the convolution are computed once, shared by the frames
+        convolution.compute()
+        for tau in taus:
+            if generation != self.generation:
+                return
+            snapshot = convolution.snapshot()
+            snapshot.setTau(tau)
+            key = snapshot.stageKey('echos')
+            frame = self.cache.get(key)
+            if frame is not None and (raster is None or frame.get('rasterKey') == raster.key):
+                continue
+            products = frame if frame is not None else snapshot.getEchoProducts()
+            if raster is not None:
+                products = dict(products, raster=raster(snapshot, products), rasterKey=raster.key)
+            self.cache.put(key, products)
+            
+    def isBusy(self):
+        return self.future is not None and not self.future.done()
+    
+    def cancel(self):
+        self.generation += 1
+        
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+
+class FrameRasterizer:
+    """Offscreen copy of the products panel, rendered to RGBA arrays."""
+    def __init__(self, size, dpi):
+        # matplotlib is only loaded when frames are rendered, see App.createCanvas
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from rendering import ProductsPanel
+        self.figure = Figure(figsize=size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.panel = ProductsPanel(self.figure)
+        
+    def frameKey(self, modeEcho):
+        """Identifies the images of this panel size and mode."""
+        return (modeEcho, tuple(self.figure.get_size_inches()), self.figure.get_dpi())
+        
+    def rasterize(self, convolution, shownX, shownH, limits, products, modeEcho=True):
+        self.panel.plotStatic(shownX, limits)
+        if modeEcho:
+            self.panel.plotWithEchos(convolution, shownH, products)
+        else:
+            self.panel.plotReverse(convolution, shownH, products)
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+
+class FrameRaster:
+    """Rendering of the frames on the precompute thread.
+
+    The rasterizer must only be used by this thread : matplotlib is not
+    thread safe, but separate Agg figures can be drawn at the same time.
+    """
+    def __init__(self, rasterizer, shownX, shownH, limits, modeEcho=True):
+        self.rasterizer = rasterizer
+        self.shownX = shownX
+        self.shownH = shownH
+        self.limits = limits
+        self.modeEcho = modeEcho
+        self.key = rasterizer.frameKey(modeEcho)
+        
+    def __call__(self, convolution, products):
+        return self.rasterizer.rasterize(convolution, self.shownX, self.shownH, self.limits, products, self.modeEcho)
+
+
+def exportAnimation(images, path, fps=10):
+    """Write RGBA images to a GIF with Pillow, or to a video with ffmpeg."""
+    if path.lower().endswith('.gif'):
+        from PIL import Image
+        frames = [Image.fromarray(image).convert('RGB') for image in images]
+        frames[0].save(path, save_all=True, append_images=frames[1:],
+                       duration=int(1000/fps), loop=0)
+        return
+    from matplotlib.animation import FFMpegWriter
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    height, width = images[0].shape[:2]
+    figure = Figure(figsize=(width/100.0, height/100.0), dpi=100)
+    FigureCanvasAgg(figure)
+    ax = figure.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    shown = ax.imshow(images[0])
+    writer = FFMpegWriter(fps=fps)
+    with writer.saving(figure, path, dpi=100):
+        for image in images:
+            shown.set_data(image)
+            writer.grab_frame()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Window of the 2-D mode : convolution of two images x(u, v) and h(u, v).
+
+The result is shown as an image with a probe point, moved with the mouse
+or the sliders like tau. The products x(s)h(p-s) seen by the kernel at the
+probe are shown next to it, their sum is the value of the result there.
+
+Fenêtre du mode 2-D : convolution de deux images, avec un point de sonde.
+
+License : GPL 3
+"""
+
+import sys
+
+from PyQt5.QtWidgets import QApplication, QWidget, QGridLayout, QSlider, QLabel, QLineEdit
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QDoubleValidator, QIntValidator
+
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+import numpy as np
+
+from convolution2d import Convolution2D, MAX_POINTS_2D
+from expression import ExpressionError
+from rendering import BlitManager
+from scheduler import UpdateScheduler
+
+SLIDER_STEPS = 1000
+
+
+class ImageApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.title = 'La convolution en deux dimensions'
+        self.convolution = Convolution2D()
+        self.scheduler = UpdateScheduler(self.plotUpdate, self)
+        self.drawnVersion = None
+
+        self.setWindowTitle(self.title)
+        self.setGeometry(80, 80, 1200, 900)
+        self.createCanvas()
+        self.createWidgets()
+        self.createGridLayout()
+        self.updateInputs()
+        self.plotUpdate()
+
+    def createCanvas(self):
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.blit = BlitManager(self.canvas)
+        axes = self.figure.subplots(2, 2)
+        self.axX, self.axH = axes[0]
+        self.axResult, self.axProducts = axes[1]
+        self.axX.set_title('x(u, v)')
+        self.axH.set_title('h(u, v)')
+        self.axResult.set_title('Convolution x * h')
+        self.axProducts.set_title('x(s) h(p-s) autour de la sonde p')
+        self.imageX = self.axX.imshow(np.zeros((1, 1)), origin='lower')
+        self.imageH = self.axH.imshow(np.zeros((1, 1)), origin='lower')
+        self.imageResult = self.axResult.imshow(np.zeros((1, 1)), origin='lower')
+        self.footprint = self.blit.addArtist(self.axX.add_patch(Rectangle((0, 0), 0, 0, fill=False, color='red')))
+        self.probeU = self.blit.addArtist(self.axResult.axvline(0, color='red'))
+        self.probeV = self.blit.addArtist(self.axResult.axhline(0, color='red'))
+        self.imageProducts = self.blit.addArtist(self.axProducts.imshow(np.zeros((1, 1)), origin='lower', cmap='RdBu_r'))
+        self.textValue = self.blit.addArtist(self.axProducts.text(0.02, 0.95, '', transform=self.axProducts.transAxes,
+                                                                  va='top', fontsize='large'))
+        self.canvas.mpl_connect('button_press_event', self.mouseProbe)
+        self.canvas.mpl_connect('motion_notify_event', self.mouseProbe)
+
+    def createWidgets(self):
+        self.XFunctionInput = QLineEdit()
+        self.XFunctionInput.returnPressed.connect(self.updateFunctions)
+        self.HFunctionInput = QLineEdit()
+        self.HFunctionInput.returnPressed.connect(self.updateFunctions)
+        self.rangeInputs = [QLineEdit() for _ in range(4)]
+        for rangeInput in self.rangeInputs:
+            rangeInput.setValidator(QDoubleValidator())
+            rangeInput.returnPressed.connect(self.updateRanges)
+        self.pointsInput = QLineEdit()
+        self.pointsInput.setValidator(QIntValidator(2, MAX_POINTS_2D))
+        self.pointsInput.returnPressed.connect(self.updatePoints)
+        self.sliderU = QSlider(Qt.Horizontal)
+        self.sliderV = QSlider(Qt.Horizontal)
+        for slider in (self.sliderU, self.sliderV):
+            slider.setMaximum(SLIDER_STEPS)
+            slider.valueChanged.connect(self.moveProbe)
+        self.MessageLabel = QLabel()
+        self.MessageLabel.setAlignment(Qt.AlignCenter)
+
+    def createGridLayout(self):
+        layout = QGridLayout()
+        layout.addWidget(self.canvas, 0, 0, 1, 4)
+        labels = ("Fonction x(u, v)", "Fonction h(u, v)", "Intervalle de u et v pour x", "Intervalle de u et v pour h",
+                  "Nombre de points par axe de x", "Sonde en u", "Sonde en v")
+        for row, text in enumerate(labels, 1):
+            label = QLabel(text)
+            label.setAlignment(Qt.AlignRight)
+            layout.addWidget(label, row, 0)
+        layout.addWidget(self.XFunctionInput, 1, 1, 1, 3)
+        layout.addWidget(self.HFunctionInput, 2, 1, 1, 3)
+        layout.addWidget(self.rangeInputs[0], 3, 1)
+        layout.addWidget(self.rangeInputs[1], 3, 2)
+        layout.addWidget(self.rangeInputs[2], 4, 1)
+        layout.addWidget(self.rangeInputs[3], 4, 2)
+        layout.addWidget(self.pointsInput, 5, 1)
+        layout.addWidget(self.sliderU, 6, 1, 1, 3)
+        layout.addWidget(self.sliderV, 7, 1, 1, 3)
+        layout.addWidget(self.MessageLabel, 8, 0, 1, 4)
+        layout.setRowStretch(0, 1000)
+        self.setLayout(layout)
+
+    def updateInputs(self):
+        convolution = self.convolution
+        self.XFunctionInput.setText(convolution.getXFunctionString())
+        self.HFunctionInput.setText(convolution.getHFunctionString())
+        values = (convolution.getMinRangeX(), convolution.getMaxRangeX(),
+                  convolution.getMinRangeH(), convolution.getMaxRangeH())
+        for rangeInput, value in zip(self.rangeInputs, values):
+            rangeInput.setText('{}'.format(value))
+        self.pointsInput.setText('{}'.format(convolution.getPoints()))
+        self.updateSliders()
+
+    def resultLimits(self):
+        u, v, result = self.convolution.getConvolution()
+        return u[0, 0], u[0, -1]
+
+    def updateSliders(self):
+        # The sliders cover the result, from minrangeX+minrangeH
+        minimum, maximum = self.resultLimits()
+        for slider, coordinate in zip((self.sliderU, self.sliderV), self.convolution.getProbe()):
+            slider.blockSignals(True)
+            slider.setValue(int(round((coordinate - minimum)/(maximum - minimum)*SLIDER_STEPS)))
+            slider.blockSignals(False)
+
+    def plotUpdate(self):
+        try:
+            self.plotImages()
+        except ExpressionError as error:
+            self.MessageLabel.setText("Fonction invalide : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.plotProbe()
+
+    def plotImages(self):
+        # Full redraw only when an image changed, moving the probe is blitted
+        convolution = self.convolution
+        u, v, result = convolution.getConvolution()
+        version = convolution.getVersion('convolution')
+        if version == self.drawnVersion:
+            return
+        self.drawnVersion = version
+        uX, vX, x = convolution.getXfunction()
+        uH, vH, h = convolution.getHfunction()
+        half = convolution.getStep()/2
+        for image, (axisU, axisV, data) in ((self.imageX, (uX, vX, x)), (self.imageH, (uH, vH, h)),
+                                            (self.imageResult, (u, v, result))):
+            image.set_data(data)
+            image.set_extent((axisU[0, 0]-half, axisU[0, -1]+half, axisV[0, 0]-half, axisV[-1, 0]+half))
+            image.set_clim(np.min(data), np.max(data) if np.max(data) > np.min(data) else np.min(data)+1)
+            image.axes.set_xlim(axisU[0, 0]-half, axisU[0, -1]+half)
+            image.axes.set_ylim(axisV[0, 0]-half, axisV[-1, 0]+half)
+        # Products in coordinates s-p, fixed whatever the probe
+        self.axProducts.set_xlim(-convolution.getMaxRangeH()-half, -convolution.getMinRangeH()+half)
+        self.axProducts.set_ylim(-convolution.getMaxRangeH()-half, -convolution.getMinRangeH()+half)
+        scale = (np.max(np.abs(x))*np.max(np.abs(h))) or 1
+        self.imageProducts.set_clim(-scale, scale)
+        separable = convolution.isSeparable()
+        self.MessageLabel.setText("Les fonctions utilisent u et v avec la syntaxe Python et la nomenclature Numpy. " +
+                                  "h {} séparable : {}.".format('est' if separable else "n'est pas",
+                                                                'deux passes 1-D' if separable else 'FFT 2-D'))
+        self.MessageLabel.setStyleSheet("")
+        self.blit.draw()
+
+    def plotProbe(self):
+        convolution = self.convolution
+        products = convolution.getProbeProducts()
+        probeU, probeV = products['probe']
+        extent = products['extent']
+        self.probeU.set_xdata([probeU, probeU])
+        self.probeV.set_ydata([probeV, probeV])
+        self.footprint.set_bounds(extent[0], extent[2], extent[1]-extent[0], extent[3]-extent[2])
+        visible = products['products'].size > 0
+        self.imageProducts.set_visible(visible)
+        if visible:
+            self.imageProducts.set_data(products['products'])
+            self.imageProducts.set_extent((extent[0]-probeU, extent[1]-probeU, extent[2]-probeV, extent[3]-probeV))
+        self.textValue.set_text("p = ({0:.2f}, {1:.2f})\n(x * h)(p) = {2:.4f}".format(probeU, probeV, products['value']))
+        self.blit.update()
+
+    def mouseProbe(self, event):
+        if event.inaxes is not self.axResult or not event.button:
+            return
+        self.scheduler.post('probe', lambda: self.setProbe(event.xdata, event.ydata))
+
+    def moveProbe(self):
+        minimum, maximum = self.resultLimits()
+        self.scheduler.post('probe', lambda: self.setProbe(
+            minimum + self.sliderU.value()*(maximum - minimum)/SLIDER_STEPS,
+            minimum + self.sliderV.value()*(maximum - minimum)/SLIDER_STEPS))
+
+    def setProbe(self, u, v):
+        self.convolution.setProbe(u, v)
+        self.updateSliders()
+
+    def updateFunctions(self):
+        try:
+            self.convolution.setXFunction(self.XFunctionInput.text())
+            self.convolution.setHFunction(self.HFunctionInput.text())
+        except ExpressionError as error:
+            self.MessageLabel.setText("Fonction invalide : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.plotUpdate()
+
+    def updateRanges(self):
+        try:
+            values = [float(rangeInput.text()) for rangeInput in self.rangeInputs]
+            self.convolution.setRangeX(*values[:2])
+            self.convolution.setRangeH(*values[2:])
+        except ValueError as error:
+            self.MessageLabel.setText("Intervalle invalide : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.plotUpdate()
+        self.updateSliders()
+
+    def updatePoints(self):
+        try:
+            self.convolution.setPoints(int(self.pointsInput.text()))
+        except ValueError as error:
+            self.MessageLabel.setText("Nombre de points invalide : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.plotUpdate()
+
+
+if __name__ == '__main__':
+
+    app = QApplication(sys.argv)
+
+    ex = ImageApp()
+    ex.show()
+
+    sys.exit(app.exec_())
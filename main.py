@@ -11,19 +11,38 @@ convolution.
 License : GPL 3
 """
 
+import json
 import sys
+import time
+from functools import partial
 
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QGroupBox, QGridLayout, QSlider, QLabel, QLineEdit, QRadioButton
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QDoubleValidator
+# Reference of the startup times, see App.recordStartup
+STARTED = time.perf_counter()
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-import matplotlib.pyplot as plt
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QGroupBox, QGridLayout, QSlider, QLabel, QLineEdit, QRadioButton, QCheckBox, QFileDialog, QShortcut
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QDoubleValidator, QIntValidator, QKeySequence
+
+# matplotlib is imported in createCanvas, after the window is shown
 from numpy import max as npmax
 from numpy import min as npmin
 
 from convolution import Convolution
+from decimation import decimate
+from diskcache import DiskCache
+from expression import ExpressionError
+from frames import FrameCache, FramePrecomputer, FrameRaster, FrameRasterizer, exportAnimation
+from profiling import profiler
+from scheduler import UpdateScheduler
+from session import LAST_SESSION, SessionError, loadSession, saveSession
+from worker import ComputeWorker
+
+# From this number of points the convolution is computed on the worker thread
+ASYNC_POINTS = 20000
+MAX_POINTS = 10**7
+PROFILE_FILE = 'profil_convolution.json'
+# Seconds from the start of main.py to the window shown, see --startup-time
+STARTUP_TARGET = 0.5
 
 class App(QWidget):
     def __init__(self):
@@ -38,40 +57,128 @@ class App(QWidget):
         self.modeEcho = True
         
         self.convolution = Convolution()
+        self.scheduler = UpdateScheduler(self.plotUpdate, self)
+        self.worker = ComputeWorker(self)
+        self.worker.finished.connect(self.computeFinished)
+        self.worker.failed.connect(self.computeFailed)
+        self.frameCache = FrameCache()
+        self.diskCache = DiskCache()
+        self.precomputer = FramePrecomputer(self.frameCache)
+        self.precomputedKey = None
+        self.rasterizer = None
+        self.lastValid = None
+        self.submittedKey = None
+        self.canvasReady = False
+        self.canvasPending = False
+        self.startupTimes = {}
+        self.quitWhenStarted = False
         
         self.initUI()
         
-        self.plotDefaults()
+        self.openLastSession()
         
     def initUI(self):
         
         self.setWindowTitle(self.title)
         self.setGeometry(self.left, self.top, self.width, self.height)
-        self.show()
         
-        self.createCanvas()
+        self.createPlaceholders()
         self.createWidgets()
 
         self.createGridLayout()
-        
+        self.show()
+        self.recordStartup('window')
+        
+    def createPlaceholders(self):
+        # Replaced by the matplotlib canvases once the window is painted
+        for name in ('canvasX', 'canvasH', 'canvasRelative', 'canvasResult', 'canvasProducts'):
+            placeholder = QLabel('Chargement...')
+            placeholder.setAlignment(Qt.AlignCenter)
+            setattr(self, name, placeholder)
+            
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.canvasReady and not self.canvasPending:
+            self.canvasPending = True
+            QTimer.singleShot(0, self.createCanvas)
+            
+    def recordStartup(self, name):
+        if name not in self.startupTimes:
+            self.startupTimes[name] = time.perf_counter() - STARTED
+        if name == 'firstPlot' and self.quitWhenStarted:
+            print(json.dumps(self.startupTimes))
+            QApplication.quit()
 
     def createCanvas(self):
+        """Create the figures in place of the placeholders, then draw them."""
+        if self.canvasReady:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        
         # Figure and canvas instances - canvas takes the `figure` instance as a parameter to __init__
-        self.figureX = plt.figure()
-        self.figureH = plt.figure()
-        self.figureRelative = plt.figure()
-        self.figureResult = plt.figure()
-        self.figureProducts = plt.figure()
-        self.canvasX = FigureCanvas(self.figureX)
-        self.canvasH = FigureCanvas(self.figureH)
-        self.canvasRelative = FigureCanvas(self.figureRelative)
-        self.canvasResult  = FigureCanvas(self.figureResult )
-        self.canvasProducts  = FigureCanvas(self.figureProducts)
+        self.figureX = Figure()
+        self.figureH = Figure()
+        self.figureRelative = Figure()
+        self.figureResult = Figure()
+        self.figureProducts = Figure()
+        layout = self.layout()
+        for name, figure in (('canvasX', self.figureX), ('canvasH', self.figureH),
+                             ('canvasRelative', self.figureRelative), ('canvasResult', self.figureResult),
+                             ('canvasProducts', self.figureProducts)):
+            placeholder = getattr(self, name)
+            canvas = FigureCanvas(figure)
+            layout.replaceWidget(placeholder, canvas)
+            placeholder.deleteLater()
+            setattr(self, name, canvas)
 
         # this is the Navigation widget
         # it takes the Canvas widget and a parent
         # self.toolbarX = NavigationToolbar(self.canvasX, self)
         
+        self.createArtists()
+        self.profileOverlay.raise_()
+        self.canvasReady = True
+        self.recordStartup('figures')
+        self.plotUpdate()
+        
+    def createArtists(self):
+        # Axes and lines are created once, the updates only change their data.
+        # Artists moving with tau or the echos are animated and blitted.
+        from rendering import BlitManager, ProductsPanel
+        self.drawn = {}
+        self.redraw = set()
+        self.blit = set()
+        
+        self.blitX = BlitManager(self.canvasX)
+        self.axX = self.figureX.add_subplot(111)
+        self.axX.set_title("x(t)")
+        self.lineX, = self.axX.plot([], [])
+        
+        self.blitH = BlitManager(self.canvasH)
+        self.axH = self.figureH.add_subplot(111)
+        self.axH.set_title("h(t)")
+        self.lineH, = self.axH.plot([], [])
+        
+        self.blitRelative = BlitManager(self.canvasRelative)
+        ax = self.axRelative = self.figureRelative.add_subplot(111)
+        ax.set_title("Positions relatives de x(t) et h(t)")
+        self.lineRelativeX, = ax.plot([], [], color='blue')
+        self.tauRelative = self.blitRelative.addArtist(ax.axvline(x=0, color='red'))
+        self.lineRelativeH = self.blitRelative.addArtist(ax.plot([], [], color='green')[0])
+        self.textRelative = self.blitRelative.addArtist(ax.text(0.9, 0.9, '', transform=ax.transAxes, fontsize='large'))
+        
+        self.blitResult = BlitManager(self.canvasResult)
+        ax = self.axResult = self.figureResult.add_subplot(111)
+        ax.set_title("Convolution x(t) et h(t)")
+        self.lineResult, = ax.plot([], [])
+        self.tauResult = self.blitResult.addArtist(ax.axvline(x=0, color='red'))
+        self.pointResult = self.blitResult.addArtist(ax.scatter([], [], color='C0'))
+        self.textResult = self.blitResult.addArtist(ax.text(0.8, 0.9, '', transform=ax.transAxes, fontsize='large'))
+        
+        self.blitProducts = BlitManager(self.canvasProducts)
+        self.products = ProductsPanel(self.figureProducts, self.blitProducts)
+        
     def createWidgets(self):
         
         #Button Widgets
@@ -84,6 +191,23 @@ class App(QWidget):
         self.buttonEcho.clicked.connect(self.setModeEcho)
         self.buttonReverse = QRadioButton('Mode retourné')
         self.buttonReverse.clicked.connect(self.setModeReverse)
+        self.buttonAnimation = QCheckBox('Animation précalculée')
+        self.buttonAnimation.toggled.connect(self.setAnimation)
+        self.buttonRaster = QCheckBox('Images précalculées')
+        self.buttonRaster.toggled.connect(self.setRaster)
+        self.buttonExport = QPushButton("Exporter l'animation")
+        self.buttonExport.clicked.connect(self.exportAnimation)
+        self.buttonImage = QPushButton('Convolution 2-D')
+        self.buttonImage.clicked.connect(self.openImageWindow)
+        self.imageWindow = None
+        self.buttonSave = QPushButton('Enregistrer la session')
+        self.buttonSave.clicked.connect(self.saveSessionAs)
+        self.buttonOpen = QPushButton('Ouvrir une session')
+        self.buttonOpen.clicked.connect(self.openSession)
+        self.buttonLean = QCheckBox('Mode économe en mémoire')
+        self.buttonLean.toggled.connect(self.setLean)
+        self.buttonFloat32 = QCheckBox('Précision simple (float32)')
+        self.buttonFloat32.toggled.connect(self.setFloat32)
         
         
         self.sliderTimeLabel = QLabel("Selection du point t à évaluer")
@@ -102,9 +226,10 @@ class App(QWidget):
         self.XFunctionLabel.setAlignment(Qt.AlignRight)
         self.HFunctionLabel = QLabel("Fonction h(t)")
         self.HFunctionLabel.setAlignment(Qt.AlignRight)
-        self.MessageLabel = QLabel("Les fonctions doivent être entrées avec" + 
-                                   " la syntaxe Python et la nomenclature Numpy. " +
-                                   "Il y a 1000 points dans le vecteur \"t\".")
+        self.pointsLabel = QLabel("Nombre de points du vecteur t")
+        self.pointsLabel.setAlignment(Qt.AlignRight)
+        self.MessageLabel = QLabel()
+        self.clearError()
         self.MessageLabel.setAlignment(Qt.AlignCenter)
         
         
@@ -140,6 +265,20 @@ class App(QWidget):
         self.HFunctionInput = QLineEdit()
         self.HFunctionInput.returnPressed.connect(self.updateHFunction)
         
+        self.pointsInput = QLineEdit()
+        self.pointsInput.setValidator(QIntValidator(2, MAX_POINTS))
+        self.pointsInput.textChanged.connect(self.updatePoints)
+        
+        # Profiling overlay over the window, F12 shows it and starts the
+        # timers, Ctrl+Shift+P writes the statistics to a file
+        self.profileOverlay = QLabel(self)
+        self.profileOverlay.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: white;"
+                                          "font-family: monospace; padding: 6px;")
+        self.profileOverlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.profileOverlay.hide()
+        QShortcut(QKeySequence('F12'), self).activated.connect(self.toggleProfiling)
+        QShortcut(QKeySequence('Ctrl+Shift+P'), self).activated.connect(self.dumpProfile)
+        
         
     def createGridLayout(self):
         # set the layout
@@ -152,7 +291,7 @@ class App(QWidget):
         layout.addWidget(self.canvasH, 0, 2, 1, 2)
         layout.addWidget(self.canvasRelative, 1, 0, 1, 4)
         layout.addWidget(self.canvasProducts, 0, 4, 2, 1)
-        layout.addWidget(self.canvasResult, 2, 4, 10, 1)
+        layout.addWidget(self.canvasResult, 2, 4, 12, 1)
         layout.addWidget(self.sliderTimeLabel, 2, 0, 1, 4)
         layout.addWidget(self.sliderTime, 3, 0, 1, 4)
         layout.addWidget(self.sliderEchoLabel, 4, 0, 1, 4)
@@ -177,17 +316,46 @@ class App(QWidget):
         layout.addWidget(self.HFunctionInput, 10,1,1,3)
         layout.addWidget(self.XFunctionLabel, 9,0,1,1)
         layout.addWidget(self.HFunctionLabel, 10,0, 1,1)
-        layout.addWidget(self.MessageLabel, 11,0, 1, 4)
+        layout.addWidget(self.pointsLabel, 11,0,1,1)
+        layout.addWidget(self.pointsInput, 11,1,1,1)
+        layout.addWidget(self.buttonAnimation, 11,2,1,1)
+        layout.addWidget(self.buttonExport, 11,3,1,1)
+        layout.addWidget(self.MessageLabel, 12,0, 1, 3)
+        layout.addWidget(self.buttonImage, 12,3, 1, 1)
+        layout.addWidget(self.buttonSave, 13,0, 1, 2)
+        layout.addWidget(self.buttonOpen, 13,2, 1, 2)
+        layout.addWidget(self.buttonLean, 14,0, 1, 2)
+        layout.addWidget(self.buttonFloat32, 14,2, 1, 2)
+        layout.addWidget(self.buttonRaster, 15,2, 1, 2)
         
         self.setLayout(layout)
 
     def plotDefaults(self):
+        self.plotSettings({})
         
+    def plotSettings(self, settings):
+        
+        self.scheduler.clear()
+        self.worker.cancel()
+        self.precomputer.cancel()
         self.convolution = Convolution()
+        self.convolution.diskCache = self.diskCache
+        self.convolution.applySettings(settings)
+        if self.buttonAnimation.isChecked():
+            self.convolution.frameCache = self.frameCache
+        self.drawn = {}
 
         self.plotUpdate()
         
+        self.updateInputs()
+        
+    def updateInputs(self):
         self.updateSlider()
+        for slider, value in ((self.sliderTime, self.convolution.getTau()*self.sliderTimeFactor),
+                              (self.sliderEcho, self.convolution.echoRate)):
+            slider.blockSignals(True)
+            slider.setValue(int(round(value)))
+            slider.blockSignals(False)
         
         self.tminXInput.setText('{}'.format(self.convolution.getMinRangeX()))
         self.tminHInput.setText('{}'.format(self.convolution.getMinRangeH()))
@@ -195,194 +363,441 @@ class App(QWidget):
         self.tmaxHInput.setText('{}'.format(self.convolution.getMaxRangeH()))
         self.XFunctionInput.setText('{}'.format(self.convolution.getXFunctionString()))
         self.HFunctionInput.setText('{}'.format(self.convolution.getHFunctionString()))
+        self.pointsInput.setText('{}'.format(self.convolution.getPoints()))
+        for button, checked in ((self.buttonLean, self.convolution.getLean()),
+                                (self.buttonFloat32, self.convolution.getDtype() == 'float32')):
+            button.blockSignals(True)
+            button.setChecked(checked)
+            button.blockSignals(False)
         
     def updateSlider(self):
-        self.sliderTime.setMinimum(self.convolution.getMinRangeX()*self.sliderTimeFactor)
-        self.sliderTime.setMaximum(self.convolution.getMaxRangeX()*self.sliderTimeFactor)
+        self.sliderTime.setMinimum(int(self.convolution.getMinRangeX()*self.sliderTimeFactor))
+        self.sliderTime.setMaximum(int(self.convolution.getMaxRangeX()*self.sliderTimeFactor))
         #self.sliderTime.setTickInterval(self.convolution.getStep())
-        self.sliderTime.setSingleStep((self.convolution.getMaxRangeX()-self.convolution.getMinRangeX())/100)
+        self.sliderTime.setSingleStep(max(int((self.convolution.getMaxRangeX()-self.convolution.getMinRangeX())/100), 1))
         
     def plotUpdate(self):
-        self.figureX.clear()
-        ax = self.figureX.add_subplot(111)
-        dataX = self.convolution.getXfunction()
-        ax.plot(dataX[0], dataX[1])
-        ax.set_title("x(t)")
-        self.canvasX.draw()
-
-        self.figureH.clear()
-        ax = self.figureH.add_subplot(111)
-        dataH = self.convolution.getHfunction()
-        ax.plot(dataH[0], dataH[1])
-        ax.set_title("h(t)")
-        self.canvasH.draw()
-        
-        self.figureRelative.clear()
-        ax = self.figureRelative.add_subplot(111)
-        tau = self.convolution.getTau()
-        ax.plot(dataX[0], dataX[1], color='blue')
-        ax.axvline(x=tau, color='red')
-        ax.plot((dataH[0]-dataH[0][0]+tau), dataH[1], color='green')
-        ax.text(0.9, 0.9, 't = {}'.format(tau), transform=ax.transAxes, fontsize='large')
-        ax.set_title("Positions relatives de x(t) et h(t)")
-        self.canvasRelative.draw()
-        
-        
-        tauindex = int(((tau-self.convolution.getMinRangeX())/self.convolution.getStep()))
-        
-        self.figureResult.clear()
-        ax = self.figureResult.add_subplot(111)
-        ax.set_title("Convolution x(t) et h(t)")
-        data = self.convolution.getConvolution()
-        ax.plot(data[0], data[1])
-        ax.axvline(x=tau, color='red')
-        ax.scatter(tau, data[1][tauindex])
-        ax.text(0.8, 0.9, 'x(t) * h(t) = {0:5.4f}'.format(data[1][tauindex]), transform=ax.transAxes, fontsize='large')
-        self.canvasResult.draw()
-        
-        if self.modeEcho == True:
-            self.productPlotWithEchos()
+        if self.convolution.needsCompute() and (self.convolution.getPoints() >= ASYNC_POINTS or not self.canvasReady):
+            # The plots keep showing the last results until the worker is done,
+            # at startup the figures are created meanwhile
+            key = self.convolution.stageKey('convolution')
+            if self.worker.isBusy() and key == self.submittedKey:
+                return
+            self.submittedKey = key
+            self.worker.submit(self.convolution)
+            self.setWindowTitle(self.title + ' (calcul en cours...)')
+            return
+        if not self.canvasReady:
+            return
+        self.worker.cancel()
+        with profiler.stage('frame'):
+            try:
+                self.plotFunctions()
+                self.plotTau()
+            except Exception as error:
+                # Invalid expressions and failed computations (memory, ...)
+                # alike, the plots go back to the last inputs that worked
+                self.restoreLastValid(error)
+                return
+            self.render()
+        self.updateOverlay()
+        self.recordStartup('firstPlot')
+        self.lastValid = self.convolution.getSettings()
+        self.precomputeFrames()
+        
+    def setAnimation(self, enabled):
+        if enabled:
+            self.convolution.frameCache = self.frameCache
+            self.precomputeFrames()
         else:
-            self.productPlotReverse()
-        
-    def productPlotWithEchos(self):
-        self.figureProducts.clear()
+            self.convolution.frameCache = None
+            self.precomputer.cancel()
+            self.precomputedKey = None
+            
+    def setLean(self, enabled):
+        # Lazy time axes and reused buffers, for the largest point counts
+        self.convolution.setLean(enabled)
+        self.plotUpdate()
         
-        tau = self.convolution.getTau()
+    def setFloat32(self, enabled):
+        self.convolution.setDtype('float32' if enabled else 'float64')
+        self.plotUpdate()
+            
+    def sliderTaus(self):
+        return [value/float(self.sliderTimeFactor)
+                for value in range(self.sliderTime.minimum(), self.sliderTime.maximum()+1)]
+        
+    def setRaster(self, enabled):
+        self.precomputeFrames()
+        
+    def backgroundRaster(self):
+        # The images of the products panel rendered on the thread of the
+        # precomputer, with an offscreen figure only used there
+        size, dpi = self.figureProducts.get_size_inches(), self.figureProducts.get_dpi()
+        if self.rasterizer is None or self.rasterizer.frameKey(self.modeEcho) != (self.modeEcho, tuple(size), dpi):
+            self.rasterizer = FrameRasterizer(size, dpi)
+        limits = self.verticalLimits(self.convolution.getXfunction(), self.convolution.getHfunction())
+        return FrameRaster(self.rasterizer, self.shownX, self.shownH, limits, self.modeEcho)
+        
+    def precomputeFrames(self):
+        # Started again only when something else than tau changed
+        if not self.buttonAnimation.isChecked():
+            return
+        raster = self.backgroundRaster() if self.buttonRaster.isChecked() and self.canvasReady else None
+        key = (self.convolution.stageKey('convolution'), self.convolution.echoRate,
+               self.sliderTime.minimum(), self.sliderTime.maximum(), raster.key if raster else None)
+        if key != self.precomputedKey:
+            self.precomputedKey = key
+            self.precomputer.start(self.convolution, self.sliderTaus(), raster)
+            
+    def exportAnimation(self):
+        if not self.canvasReady:
+            return
+        path, selected = QFileDialog.getSaveFileName(self, "Exporter l'animation", 'animation.gif',
+                                                     "GIF (*.gif);;Vidéo (*.mp4)")
+        if not path:
+            return
         dataX = self.convolution.getXfunction()
         dataH = self.convolution.getHfunction()
+        rasterizer = FrameRasterizer(self.figureProducts.get_size_inches(), self.figureProducts.get_dpi())
+        rasterKey = rasterizer.frameKey(self.modeEcho)
+        limits = self.verticalLimits(dataX, dataH)
+        images = []
+        for tau in self.sliderTaus():
+            snapshot = self.convolution.snapshot()
+            snapshot.setTau(tau)
+            key = snapshot.stageKey('echos')
+            # The frames precomputed with their image are only read, the
+            # others are rendered here
+            frame = self.frameCache.get(key)
+            if frame is None or frame.get('rasterKey') != rasterKey:
+                products = frame if frame is not None else snapshot.getEchoProducts()
+                image = rasterizer.rasterize(snapshot, self.shownX, self.shownH, limits, products, self.modeEcho)
+                frame = self.frameCache.put(key, dict(products, raster=image, rasterKey=rasterKey))
+            images.append(frame['raster'])
+        exportAnimation(images, path)
+        
+    def openImageWindow(self):
+        if self.imageWindow is None:
+            from imagewindow import ImageApp
+            self.imageWindow = ImageApp()
+        self.imageWindow.show()
+        self.imageWindow.raise_()
+        
+    def restoreLastValid(self, error):
+        # Go back to the last inputs that worked so the plots stay usable
+        if self.lastValid is not None:
+            self.convolution.applySettings(self.lastValid)
+            self.updateInputs()
+            self.plotUpdate()
+        elif self.convolution.getSettings() != Convolution().getSettings():
+            # Nothing worked yet, such as a restored session : the defaults
+            self.plotDefaults()
+        self.showError(error)
+        
+    def computeFinished(self, generation, snapshot):
+        if not self.worker.isCurrent(generation):
+            return
+        self.setWindowTitle(self.title)
+        self.convolution.adopt(snapshot)
+        self.plotUpdate()
+        
+    def computeFailed(self, generation, error):
+        if not self.worker.isCurrent(generation):
+            return
+        self.setWindowTitle(self.title)
+        self.restoreLastValid(error)
         
-        ax = self.figureProducts.add_subplot(111)
-        ax.axvline(x=tau, color='red')
-        ax.plot(dataX[0], dataX[1], color='blue')
-        ax.plot((dataH[0]-dataH[0][0]+tau), dataH[1], color='green')
-        tauindex = int(((tau-self.convolution.getMinRangeX())/self.convolution.getStep()))
-        ax.text(0.7, 0.95, r'$\Delta\tau=$ {0:5.4f}'.format(self.convolution.getEchoPoints()*self.convolution.getStep()), transform=ax.transAxes, fontsize='large')
-        textincrement = 0
-        total=dataH[1][0]*dataX[1][tauindex]*self.convolution.getEchoPoints()*self.convolution.getStep()
-        ax.scatter(tau, dataX[1][tauindex], marker='x')
-        for i, echo in enumerate(self.convolution.createEchos()):
+    def interfaceState(self):
+        return {'modeEcho': self.modeEcho, 'animation': self.buttonAnimation.isChecked(),
+                'raster': self.buttonRaster.isChecked()}
+    
+    def applySession(self, settings, interface):
+        self.modeEcho = interface.get('modeEcho', True)
+        self.buttonEcho.setChecked(self.modeEcho)
+        self.buttonReverse.setChecked(not self.modeEcho)
+        # Without the signal : setAnimation would precompute the frames of the
+        # convolution replaced by plotSettings, which starts them after its plot
+        for button, name in ((self.buttonAnimation, 'animation'), (self.buttonRaster, 'raster')):
+            button.blockSignals(True)
+            button.setChecked(interface.get(name, False))
+            button.blockSignals(False)
+        self.precomputedKey = None
+        self.plotSettings(settings)
+        
+    def openLastSession(self):
+        # The session of the last run is opened at startup when there is one
+        if LAST_SESSION is None:
+            self.plotDefaults()
+            return
+        try:
+            settings, interface = loadSession(LAST_SESSION)
+        except SessionError:
+            self.plotDefaults()
+            return
+        self.applySession(settings, interface)
+        
+    def saveSessionAs(self):
+        path, selected = QFileDialog.getSaveFileName(self, "Enregistrer la session", 'session.json',
+                                                     "Session (*.json)")
+        if not path:
+            return
+        try:
+            saveSession(path, self.convolution.getSettings(), self.interfaceState())
+        except OSError as error:
+            self.MessageLabel.setText("Impossible d'enregistrer la session : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.MessageLabel.setText("Session enregistrée dans {}".format(path))
+        
+    def openSession(self):
+        path, selected = QFileDialog.getOpenFileName(self, "Ouvrir une session", '', "Session (*.json)")
+        if not path:
+            return
+        try:
+            settings, interface = loadSession(path)
+        except SessionError as error:
+            self.MessageLabel.setText("Session invalide : {}".format(error))
+            self.MessageLabel.setStyleSheet("color: red")
+            return
+        self.clearError()
+        self.applySession(settings, interface)
+        
+    def closeEvent(self, event):
+        # The last inputs that were plotted, the current ones may not work
+        if LAST_SESSION is not None and self.lastValid is not None:
             try:
-                intersection = (dataX[1][i*(self.convolution.getEchoPoints())]*
-                                dataH[1][self.convolution.getHindex(echo-self.convolution.getMinRangeX()+self.convolution.getMinRangeH())])
-            except IndexError:
-                intersection = 0
-                
-            if intersection>0:
-                tOffset = dataH[0][0]-tau+echo-self.convolution.getMinRangeX()
-                line, = ax.plot((dataH[0]-tOffset), dataX[1][i*(self.convolution.getEchoPoints())] * dataH[1], alpha = 0.5)
-                ax.scatter(tau, intersection, color=line.get_color())
-                if textincrement < 16:
-                    ax.text(0.7, 0.9-textincrement*0.05, 
-                            r'$x(t-\tau_{{{0}}})h(\tau_{{{0}}}) =$ {1:5.4f}'.format(textincrement+1, intersection), 
-                            transform=ax.transAxes, fontsize='large', color=line.get_color())
-                    textincrement+=1
-                total += intersection*self.convolution.getEchoPoints()*self.convolution.getStep()
-                
-        ax.text(0.95, 0.1, r"$\sum{{x(t-\tau_{{n}})\cdot h(\tau_{{n}})\cdot\Delta\tau}}=${0:5.2f}".format(total), transform=ax.transAxes, fontsize='x-large', ha='right')
-        ax.set_title("Translation de h(t) en un point")
-        minVert = npmin([dataX[1], dataH[1]])
-        maxVert = npmax([dataX[1], dataH[1]])
-        adjust = (maxVert-minVert)*0.1
-        plt.axis([dataX[0][0], dataX[0][-1], minVert-adjust, maxVert+adjust])
-        self.canvasProducts.draw()
+                saveSession(LAST_SESSION, self.lastValid, self.interfaceState())
+            except OSError:
+                pass
+        self.worker.shutdown()
+        self.precomputer.shutdown()
+        super().closeEvent(event)
+        
+    def changed(self, name, key):
+        """True when the data drawn by a part of a canvas is not key anymore."""
+        if self.drawn.get(name) == key:
+            return False
+        self.drawn[name] = key
+        return True
     
-    def productPlotReverse(self):
-        self.figureProducts.clear()
-                
-        tau = self.convolution.getTau()
+    def pixels(self):
+        """Width in pixels of the widest canvas."""
+        canvas = max((self.canvasProducts, self.canvasResult, self.canvasRelative), key=lambda canvas: canvas.width())
+        return max(int(canvas.width()*canvas.devicePixelRatioF()), 200)
+    
+    def verticalLimits(self, dataX, dataH):
+        minVert = npmin([npmin(dataX[1]), npmin(dataH[1])])
+        maxVert = npmax([npmax(dataX[1]), npmax(dataH[1])])
+        adjust = (maxVert-minVert)*0.1 or 1
+        return minVert-adjust, maxVert+adjust
+        
+    def plotFunctions(self):
+        # Static artists, the canvas is fully redrawn only if its data changed
         dataX = self.convolution.getXfunction()
         dataH = self.convolution.getHfunction()
+        data = self.convolution.getConvolution()
+        versionX = self.convolution.getVersion('x')
+        versionH = self.convolution.getVersion('h')
+        
+        # Computations use every point, the curves are drawn with about two
+        # points per pixel
+        if self.changed('shownX', versionX):
+            self.shownX = decimate(dataX[0], dataX[1], self.pixels())
+        if self.changed('shownH', versionH):
+            self.shownH = decimate(dataH[0], dataH[1], self.pixels())
+        
+        if self.changed('x', versionX):
+            self.lineX.set_data(*self.shownX)
+            self.axX.relim()
+            self.axX.autoscale_view()
+            self.redraw.add(self.blitX)
+            
+        if self.changed('h', versionH):
+            self.lineH.set_data(*self.shownH)
+            self.axH.relim()
+            self.axH.autoscale_view()
+            self.redraw.add(self.blitH)
+            
+        if self.changed('relative', (versionX, versionH)):
+            self.lineRelativeX.set_data(*self.shownX)
+            # Room for h(t) shifted up to the end of x(t)
+            self.axRelative.set_xlim(dataX[0][0], dataX[0][-1]+dataH[0][-1]-dataH[0][0])
+            self.axRelative.set_ylim(*self.verticalLimits(dataX, dataH))
+            self.redraw.add(self.blitRelative)
+            
+        if self.changed('result', self.convolution.getVersion('convolution')):
+            self.lineResult.set_data(*decimate(data[0], data[1], self.pixels()))
+            self.axResult.relim()
+            self.axResult.autoscale_view()
+            self.redraw.add(self.blitResult)
+            
+        if self.changed('products', (versionX, versionH)):
+            self.products.plotStatic(self.shownX, self.verticalLimits(dataX, dataH))
+            self.redraw.add(self.blitProducts)
+        
+    def plotTau(self):
+        # Animated artists, moved without redrawing the axes
+        tau = self.convolution.getTau()
+        dataH = self.shownH
+        self.convolution.getConvolution()
+        
+        if self.changed('relativeTau', (tau, self.convolution.getVersion('h'))):
+            self.tauRelative.set_xdata([tau, tau])
+            self.lineRelativeH.set_data(dataH[0]-dataH[0][0]+tau, dataH[1])
+            self.textRelative.set_text('t = {}'.format(tau))
+            self.blit.add(self.blitRelative)
+        
+        if self.changed('resultTau', (tau, self.convolution.getVersion('convolution'))):
+            value = self.convolution.getConvolutionAt(tau)
+            self.tauResult.set_xdata([tau, tau])
+            self.pointResult.set_offsets([[tau, value]])
+            self.textResult.set_text('x(t) * h(t) = {0:5.4f}'.format(value))
+            self.blit.add(self.blitResult)
+        
+        self.convolution.getEchoProducts()
+        if self.changed('productsTau', (self.convolution.getVersion('echos'), self.modeEcho)):
+            if self.modeEcho == True:
+                self.productPlotWithEchos()
+            else:
+                self.productPlotReverse()
+            self.blit.add(self.blitProducts)
+            
+    def render(self):
+        managers = (self.blitX, self.blitH, self.blitRelative, self.blitResult, self.blitProducts)
+        profiler.count('skipped redraw', len(managers) - len(self.redraw | self.blit))
+        for manager in self.redraw:
+            with profiler.stage('draw'):
+                manager.draw()
+        for manager in self.blit - self.redraw:
+            with profiler.stage('blit'):
+                manager.update()
+        self.redraw.clear()
+        self.blit.clear()
+        
+    def toggleProfiling(self):
+        profiler.setEnabled(not profiler.enabled)
+        if profiler.enabled:
+            profiler.reset()
+            self.updateOverlay()
+        self.profileOverlay.setVisible(profiler.enabled)
+        
+    def updateOverlay(self):
+        if not profiler.enabled:
+            return
+        self.profileOverlay.setText('Image : {:.1f} ms\n{}'.format(profiler.last('frame')*1000, profiler.summary()))
+        self.profileOverlay.adjustSize()
+        self.profileOverlay.move(10, 10)
+        self.profileOverlay.raise_()
+        
+    def dumpProfile(self):
+        profiler.dump(PROFILE_FILE)
+        self.MessageLabel.setText("Statistiques enregistrées dans {}".format(PROFILE_FILE))
         
-        ax = self.figureProducts.add_subplot(111)
-        ax.axvline(x=tau, color='red')
-        ax.plot(dataX[0], dataX[1], color='blue')
-        ax.plot(-(dataH[0]-dataH[0][0])+tau, dataH[1], color='green')
-        tauindex = int(((tau-self.convolution.getMinRangeX())/self.convolution.getStep()))
-        ax.text(0.7, 0.95, r'$\Delta\tau=$ {0:5.4f}'.format(self.convolution.getEchoPoints()*self.convolution.getStep()), transform=ax.transAxes, fontsize='large')
-        textincrement = 0
-        total=dataH[1][0]*dataX[1][tauindex]*self.convolution.getEchoPoints()*self.convolution.getStep()
-        ax.scatter(tau, dataX[1][tauindex], marker='x')
-        for i, echo in enumerate(self.convolution.createEchos()):
-            try:
-                intersection = (dataX[1][i*(self.convolution.getEchoPoints())]*
-                                dataH[1][self.convolution.getHindex(echo-self.convolution.getMinRangeX()+
-                                     self.convolution.getMinRangeH())])
-            except IndexError:
-                intersection = 0
-                
-            if intersection>0:
-                xposition = tau-echo+self.convolution.getMinRangeX()
-                line, = ax.plot([xposition, xposition], [0, intersection])
-                #Find color and apply to scatter and text
-                ax.scatter(xposition, intersection, color=line.get_color())
-                if textincrement < 16:
-                    ax.text(0.7, 0.9-textincrement*0.05, 
-                            r'$x(t-\tau_{{{0}}})h(\tau_{{{0}}}) =$ {1:5.4f}'.format(textincrement+1, intersection), 
-                            transform=ax.transAxes, fontsize='large', color=line.get_color())
-                    textincrement+=1
-                total += intersection*self.convolution.getEchoPoints()*self.convolution.getStep()
-                
-        ax.text(0.95, 0.1, r"$\sum{{x(\tau_{{n}})\cdot h(t-\tau_{{n}})\cdot\Delta\tau}}=${0:5.2f}".format(total), transform=ax.transAxes, fontsize='x-large', ha='right')
-        ax.set_title("Translation de h(t) en un point")
-        #SET Axes to fix X
-        minVert = npmin([dataX[1], dataH[1]])
-        maxVert = npmax([dataX[1], dataH[1]])
-        adjust = (maxVert-minVert)*0.1
-        plt.axis([dataX[0][0], dataX[0][-1], minVert-adjust, maxVert+adjust])
-        self.canvasProducts.draw()
+    def productPlotWithEchos(self):
+        self.products.plotWithEchos(self.convolution, self.shownH, self.convolution.getEchoProducts())
+    
+    def productPlotReverse(self):
+        self.products.plotReverse(self.convolution, self.shownH, self.convolution.getEchoProducts())
         
     
     def updateMinRangeX(self, minvalue):
-        self.convolution.setMinRangeX(float(minvalue))
-        self.plotUpdate()
-        self.updateSlider()
+        self.scheduler.debounce('minRangeX', partial(self.applyRange, 'setMinRangeX', minvalue))
         
     def updateMaxRangeX(self, maxvalue):
-        self.convolution.setMaxRangeX(float(maxvalue))
-        self.plotUpdate()
-        self.updateSlider()
+        self.scheduler.debounce('maxRangeX', partial(self.applyRange, 'setMaxRangeX', maxvalue))
         
     def updateMinRangeH(self, minvalue):
-        self.convolution.setMinRangeH(float(minvalue))
-        self.plotUpdate()
-        self.updateSlider()
+        self.scheduler.debounce('minRangeH', partial(self.applyRange, 'setMinRangeH', minvalue))
         
     def updateMaxRangeH(self, maxvalue):
-        self.convolution.setMaxRangeH(float(maxvalue))
-        self.plotUpdate()
+        self.scheduler.debounce('maxRangeH', partial(self.applyRange, 'setMaxRangeH', maxvalue))
+        
+    def applyRange(self, setterName, value):
+        try:
+            value = float(value)
+        except ValueError:
+            # Text still being typed, such as '' or '-'
+            return
+        if value == getattr(self.convolution, 'g' + setterName[1:])():
+            return
+        getattr(self.convolution, setterName)(value)
         self.updateSlider()
         
     def updateXFunction(self):
-        self.convolution.setXFunction(self.XFunctionInput.text())
-        self.plotUpdate()
+        self.updateFunction(self.convolution.setXFunction, self.XFunctionInput.text())
         
     def updateHFunction(self):
-        self.convolution.setHFunction(self.HFunctionInput.text())
+        self.updateFunction(self.convolution.setHFunction, self.HFunctionInput.text())
+        
+    def updateFunction(self, setter, stringFunction):
+        try:
+            setter(stringFunction)
+        except ExpressionError as error:
+            self.showError(error)
+            return
+        self.clearError()
         self.plotUpdate()
+        
+    def updatePoints(self, points):
+        self.scheduler.debounce('points', partial(self.applyPoints, points))
+        
+    def applyPoints(self, points):
+        try:
+            points = int(points)
+        except ValueError:
+            return
+        if 2 <= points <= MAX_POINTS and points != self.convolution.getPoints():
+            self.convolution.setPoints(points)
+            self.clearError()
+        
+    def showError(self, error):
+        if isinstance(error, ExpressionError):
+            self.MessageLabel.setText("Fonction invalide : {}".format(error))
+        else:
+            # The type is shown too, a MemoryError has no message
+            detail = type(error).__name__ + (' : {}'.format(error) if str(error) else '')
+            self.MessageLabel.setText("Erreur de calcul : {}".format(detail))
+        self.MessageLabel.setStyleSheet("color: red")
+        
+    def clearError(self):
+        self.MessageLabel.setText("Les fonctions doivent être entrées avec" + 
+                                  " la syntaxe Python et la nomenclature Numpy. " +
+                                  "Il y a {} points dans le vecteur \"t\".".format(self.convolution.getPoints()))
+        self.MessageLabel.setStyleSheet("")
     
     def moveTau(self):
+        self.scheduler.post('tau', self.applyTau)
+        
+    def applyTau(self):
         tau = self.sliderTime.value()/float(self.sliderTimeFactor)
         self.convolution.setTau(tau)
-        self.plotUpdate()
         
     def changeNumberOfEchos(self):
+        self.scheduler.post('echoRate', self.applyEchoRate)
+        
+    def applyEchoRate(self):
         self.convolution.setEchoRate(self.sliderEcho.value())
-        self.plotUpdate()
         
     def setModeEcho(self):
         self.modeEcho = True
-        self.productPlotWithEchos()
+        self.plotUpdate()
         
     def setModeReverse(self):
         self.modeEcho = False
-        self.productPlotReverse()
+        self.plotUpdate()
 
 if __name__ == '__main__':
+    
+    if '--new-session' in sys.argv:
+        # Start from the defaults, the session is not saved either
+        LAST_SESSION = None
 
     app = QApplication(sys.argv)
 
     ex = App()
+    # Prints the startup times in JSON and quits after the first plot
+    ex.quitWhenStarted = '--startup-time' in sys.argv
 
     sys.exit(app.exec_())
     
\ No newline at end of file
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lightweight timers and counters for the hot paths.
+
+    with profiler.stage('convolution'):
+        ...
+    profiler.count('cache hit')
+
+When the profiler is disabled, stage returns a shared context that does
+nothing and count returns at once, so the instrumentation can stay in place.
+
+Chronomètres et compteurs des parties critiques.
+
+License : GPL 3
+"""
+
+import json
+import time
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exception):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exception):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+        
+    def reset(self):
+        # name : [calls, total, last, maximum] in seconds
+        self.timers = {}
+        self.counters = {}
+        
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+    
+    def record(self, name, duration):
+        timer = self.timers.setdefault(name, [0, 0.0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += duration
+        timer[2] = duration
+        timer[3] = max(timer[3], duration)
+        
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            
+    def last(self, name):
+        return self.timers[name][2] if name in self.timers else 0.0
+        
+    def summary(self):
+        lines = ['{:24s} {:8.2f} ms (moy. {:8.2f} ms, {} appels)'.format(name, last*1000, total*1000/calls, calls)
+                 for name, (calls, total, last, maximum) in sorted(self.timers.items())]
+        lines += ['{:24s} {}'.format(name, value) for name, value in sorted(self.counters.items())]
+        return '\n'.join(lines)
+    
+    def dump(self, path):
+        stats = {'timers': {name: {'calls': calls, 'total': total, 'last': last, 'max': maximum}
+                            for name, (calls, total, last, maximum) in self.timers.items()},
+                 'counters': self.counters}
+        with open(path, 'w') as statsFile:
+            json.dump(stats, statsFile, indent=1)
+
+
+profiler = Profiler()
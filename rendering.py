@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Blitting helper for the matplotlib canvases of the application.
+
+The static artists of a canvas are rendered once and saved as a background.
+The moving artists (tau line, shifted h, echos, texts) are marked animated
+and drawn over that background, so moving tau does not redraw the axes.
+
+The products panel is a class of its own so the same drawing can be done
+on the interface canvas or on an offscreen figure.
+
+Rendu par « blitting » : seuls les éléments qui bougent sont redessinés.
+
+License : GPL 3
+"""
+
+import matplotlib
+from matplotlib.collections import LineCollection
+import numpy as np
+
+
+class BlitManager:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.background = None
+        self.artists = []
+        # Every full draw (first paint, resize, static change) saves a new
+        # background without the animated artists
+        canvas.mpl_connect('draw_event', self.onDraw)
+
+    def addArtist(self, artist):
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def onDraw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.drawAnimated()
+
+    def drawAnimated(self):
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def draw(self):
+        """Full redraw, needed when the static artists or the axes change."""
+        self.canvas.draw()
+
+    def update(self):
+        """Redraw only the animated artists over the saved background."""
+        if self.background is None:
+            self.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.drawAnimated()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+class ProductsPanel:
+    """Panel of the products x(t-tau_n)h(tau_n) for one tau.
+
+    With a BlitManager the moving artists are animated, without one the
+    panel draws normally, as needed for offscreen rendering.
+    """
+    def __init__(self, figure, blitManager=None):
+        self.colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+        moving = blitManager.addArtist if blitManager is not None else (lambda artist: artist)
+        ax = self.ax = figure.add_subplot(111)
+        ax.set_title("Translation de h(t) en un point")
+        self.lineX, = ax.plot([], [], color='blue')
+        self.tauLine = moving(ax.axvline(x=0, color='red'))
+        self.lineH = moving(ax.plot([], [], color='green')[0])
+        self.echoLines = moving(ax.add_collection(LineCollection([]), autolim=False))
+        self.echoScatter = moving(ax.scatter([], []))
+        self.pointX = moving(ax.scatter([], [], marker='x', color='C0'))
+        self.textDeltaTau = moving(ax.text(0.7, 0.95, '', transform=ax.transAxes, fontsize='large'))
+        self.echoTexts = [moving(ax.text(0.7, 0.9-i*0.05, '', transform=ax.transAxes, fontsize='large'))
+                          for i in range(16)]
+        self.textTotal = moving(ax.text(0.95, 0.1, '', transform=ax.transAxes, fontsize='x-large', ha='right'))
+
+    def plotStatic(self, shownX, limits):
+        self.lineX.set_data(*shownX)
+        self.ax.axis([shownX[0][0], shownX[0][-1], *limits])
+
+    def plotWithEchos(self, convolution, shownH, products):
+        tau = products['tau']
+        dataX = convolution.getXfunction()
+        dataH = shownH
+
+        self.lineH.set_data((dataH[0]-dataH[0][0]+tau), dataH[1])
+        visible = products['visible']
+        intersections = products['intersections'][visible]
+        tOffset = dataH[0][0]-tau+products['echos'][visible]-convolution.getMinRangeX()
+        segments = np.stack((dataH[0][np.newaxis, :]-tOffset[:, np.newaxis],
+                             dataX[1][products['xIndex'][visible], np.newaxis]*dataH[1][np.newaxis, :]), axis=-1)
+        self.plotEchos(tau, products, segments, np.full(intersections.size, tau), 0.5)
+        self.textTotal.set_text(r"$\sum{{x(t-\tau_{{n}})\cdot h(\tau_{{n}})\cdot\Delta\tau}}=${0:5.2f}".format(products['total']))
+
+    def plotReverse(self, convolution, shownH, products):
+        tau = products['tau']
+        dataH = shownH
+
+        self.lineH.set_data(-(dataH[0]-dataH[0][0])+tau, dataH[1])
+        visible = products['visible']
+        intersections = products['intersections'][visible]
+        xpositions = tau-products['echos'][visible]+convolution.getMinRangeX()
+        segments = np.stack((np.column_stack((xpositions, xpositions)),
+                             np.column_stack((np.zeros(intersections.size), intersections))), axis=-1)
+        self.plotEchos(tau, products, segments, xpositions, 1)
+        self.textTotal.set_text(r"$\sum{{x(\tau_{{n}})\cdot h(t-\tau_{{n}})\cdot\Delta\tau}}=${0:5.2f}".format(products['total']))
+
+    def plotEchos(self, tau, products, segments, xpositions, alpha):
+        intersections = products['intersections'][products['visible']]
+        colors = [self.colors[i % len(self.colors)] for i in range(intersections.size)]
+
+        self.tauLine.set_xdata([tau, tau])
+        self.textDeltaTau.set_text(r'$\Delta\tau=$ {0:5.4f}'.format(products['deltaTau']))
+        self.pointX.set_offsets([[tau, products['xTau']]])
+        self.echoLines.set_segments(segments)
+        self.echoLines.set_color(colors)
+        self.echoLines.set_alpha(alpha)
+        #Same color for the line, the point and the text of an echo
+        self.echoScatter.set_offsets(np.column_stack((xpositions, intersections)))
+        self.echoScatter.set_color(colors)
+        for textincrement, text in enumerate(self.echoTexts):
+            if textincrement < intersections.size:
+                text.set_text(r'$x(t-\tau_{{{0}}})h(\tau_{{{0}}}) =$ {1:5.4f}'.format(textincrement+1, intersections[textincrement]))
+                text.set_color(colors[textincrement])
+            text.set_visible(textincrement < intersections.size)
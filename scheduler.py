@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Coalescing of the interface events before updating the plots.
+
+Each event posts an action under a key. A newer action with the same key
+replaces the pending one (latest value wins), and all the actions due are
+applied together followed by a single update. Sliders are throttled to one
+update per frame : a pending key keeps its deadline, so a continuous drag
+still updates every frame. Text inputs are debounced, each new value
+restarts the delay so intermediate values are dropped.
+
+Regroupement des événements de l'interface avant la mise à jour des
+graphiques.
+
+License : GPL 3
+"""
+
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QTimer
+
+FRAME_DELAY = 16
+TYPING_DELAY = 300
+
+
+class UpdateScheduler(QObject):
+    def __init__(self, update, parent=None):
+        super().__init__(parent)
+        self.update = update
+        self.pending = OrderedDict()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        
+    def post(self, key, action, delay=FRAME_DELAY):
+        """Apply action after delay ms, or at the deadline of the pending action of key it replaces."""
+        if key in self.pending:
+            deadline, previous = self.pending[key]
+            self.pending[key] = (deadline, action)
+            return
+        self.pending[key] = (time.monotonic() + delay/1000.0, action)
+        self.restart()
+        
+    def debounce(self, key, action, delay=TYPING_DELAY):
+        """Apply action delay ms after the last post of key, replacing its pending action."""
+        self.pending.pop(key, None)
+        self.pending[key] = (time.monotonic() + delay/1000.0, action)
+        self.restart()
+        
+    def restart(self):
+        if not self.pending:
+            self.timer.stop()
+            return
+        deadline = min(due for due, action in self.pending.values())
+        self.timer.start(max(int((deadline - time.monotonic())*1000), 0))
+        
+    def flush(self):
+        now = time.monotonic()
+        due = [key for key, (deadline, action) in self.pending.items() if deadline <= now]
+        for key in due:
+            deadline, action = self.pending.pop(key)
+            action()
+        if due:
+            self.update()
+        self.restart()
+        
+    def clear(self):
+        self.pending.clear()
+        self.timer.stop()
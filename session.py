@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Saving and loading of sessions.
+
+A session is a JSON file with the settings of the convolution (see
+Convolution.getSettings : expressions, ranges, points, tau, echoRate, ...)
+and the state of the interface. The settings are checked on a new
+Convolution before they are returned, so a bad file never changes the
+current one.
+
+Enregistrement et ouverture des sessions.
+
+License : GPL 3
+"""
+
+import json
+import os
+
+import numpy as np
+
+from convolution import Convolution
+from diskcache import cacheDirectory
+
+SESSION_VERSION = 1
+# Session saved when the application is closed and opened at its start
+LAST_SESSION = os.path.join(cacheDirectory(), 'session.json')
+
+
+class SessionError(ValueError):
+    pass
+
+
+def saveSession(path, settings, interface=None):
+    """Write the settings of a convolution and of the interface to path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    session = {'version': SESSION_VERSION, 'convolution': settings, 'interface': interface or {}}
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as sessionFile:
+        json.dump(session, sessionFile, indent=1)
+    os.replace(temporary, path)
+
+
+def loadSession(path):
+    """Settings of the convolution and of the interface saved in path.
+
+    Raises SessionError if the file cannot be read or its settings are invalid.
+    """
+    try:
+        with open(path) as sessionFile:
+            session = json.load(sessionFile)
+    except (OSError, ValueError) as error:
+        raise SessionError("Cannot read the session '{}': {}".format(path, error))
+    if not isinstance(session, dict) or session.get('version') != SESSION_VERSION:
+        raise SessionError("'{}' is not a session of version {}".format(path, SESSION_VERSION))
+    settings = session.get('convolution', {})
+    interface = session.get('interface', {})
+    if not isinstance(settings, dict) or not isinstance(interface, dict):
+        raise SessionError("Invalid session '{}': the settings are not a JSON object".format(path))
+    convolution = Convolution()
+    try:
+        convolution.applySettings(settings)
+    except (AttributeError, TypeError, ValueError) as error:
+        raise SessionError("Invalid session '{}': {}".format(path, error))
+    # The step is the length of the range over the points, it must not be 0
+    for name, low, high in (('x', convolution.getMinRangeX(), convolution.getMaxRangeX()),
+                            ('h', convolution.getMinRangeH(), convolution.getMaxRangeH())):
+        if not np.isfinite(low) or not np.isfinite(high) or high <= low:
+            raise SessionError("Invalid session '{}': empty range of {} [{}, {}]".format(path, name, low, high))
+    return settings, interface
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Stage tracking shared by the Convolution and Convolution2D classes.
+
+A computation is a set of stages, each one listing the stages that depend
+on it. Changing an input invalidates its stage and everything after it, a
+stage is computed again only when it is stale, and its version counter
+tells the plots whether what they show is still current. The inputs common
+to both classes (functions, ranges, points and engine) are set here too.
+
+Suivi des étapes de calcul communes aux convolutions 1-D et 2-D.
+
+License : GPL 3
+"""
+
+from profiling import profiler
+
+
+class StagedComputation:
+    # Stage -> stages depending on it, set by the subclasses
+    STAGES = {}
+    # Prefix of the profiler counters of the recomputations
+    PROFILE_NAME = 'recompute '
+
+    def __init__(self):
+        self.stale = set(self.STAGES)
+        self.versions = dict.fromkeys(self.STAGES, 0)
+
+    def invalidate(self, stage):
+        self.stale.add(stage)
+        for dependent in self.STAGES[stage]:
+            self.invalidate(dependent)
+
+    def isStale(self, stage):
+        return stage in self.stale
+
+    def getVersion(self, stage):
+        """Incremented each time a stage is recomputed."""
+        return self.versions[stage]
+
+    def computed(self, stage):
+        profiler.count(self.PROFILE_NAME + stage)
+        self.stale.discard(stage)
+        self.versions[stage] += 1
+
+    def setXFunction(self, stringFunction):
+        if stringFunction != self.XFunctionString:
+            # Raises ExpressionError and keeps the previous function if invalid
+            self.XCode = self.compile(stringFunction)
+            self.XFunctionString = stringFunction
+            self.invalidate('x')
+
+    def setHFunction(self, stringFunction):
+        if stringFunction != self.HFunctionString:
+            self.HCode = self.compile(stringFunction)
+            self.HFunctionString = stringFunction
+            self.invalidate('h')
+
+    def applyInputs(self, settings):
+        """Set the points, ranges, functions and engine given in settings, see applySettings."""
+        if 'points' in settings:
+            self.setPoints(settings['points'])
+        if (settings.get('minRangeX', self.minrangeX), settings.get('maxRangeX', self.maxrangeX)) != (self.minrangeX, self.maxrangeX):
+            self.setRangeX(settings.get('minRangeX', self.minrangeX), settings.get('maxRangeX', self.maxrangeX))
+        if (settings.get('minRangeH', self.minrangeH), settings.get('maxRangeH', self.maxrangeH)) != (self.minrangeH, self.maxrangeH):
+            self.setRangeH(settings.get('minRangeH', self.minrangeH), settings.get('maxRangeH', self.maxrangeH))
+        if 'XFunction' in settings:
+            self.setXFunction(settings['XFunction'])
+        if 'HFunction' in settings:
+            self.setHFunction(settings['HFunction'])
+        if 'engine' in settings:
+            self.setEngine(settings['engine'])
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Convolution of signals too large to be held in memory.
+
+x is read by blocks from a generator of arrays, an array or memory-mapped
+.npy file, or a raw binary file. Each block is convolved with h by
+overlap-add (engine.BlockConvolver) and the output is written as it comes
+to a memory-mapped .npy file, or appended to a raw binary file.
+
+Convolution de signaux plus grands que la mémoire, bloc par bloc.
+
+License : GPL 3
+"""
+
+import numpy as np
+
+from engine import BlockConvolver, ComputationCancelled
+
+# Samples read at once from a file
+READ_BLOCK = 2**20
+
+
+def openSource(source, dtype=np.float64):
+    """Array like view of a file, or the source itself if it is not a path."""
+    if isinstance(source, str):
+        if source.endswith('.npy'):
+            return np.load(source, mmap_mode='r')
+        return np.memmap(source, dtype=dtype, mode='r')
+    return source
+
+
+def readBlocks(source, blockSize=READ_BLOCK):
+    """Blocks of x from an array (memory-mapped or not) or from an iterable."""
+    if hasattr(source, 'shape'):
+        for start in range(0, source.shape[0], blockSize):
+            yield np.asarray(source[start:start+blockSize], dtype=float)
+    else:
+        for block in source:
+            yield np.asarray(block, dtype=float)
+
+
+def streamConvolve(source, h, output, step=1.0, blockSize=READ_BLOCK, dtype=np.float64,
+                   length=None, cancelled=None):
+    """Convolve x from source with h, times step, writing to the file output.
+
+    The output has length+h.size-1 samples. A .npy output needs the length
+    of x, known for arrays and files and given by length for generators;
+    other outputs are raw binary files of dtype. Returns the output opened
+    as a read-only memory map.
+    """
+    source = openSource(source, dtype)
+    h = np.asarray(h, dtype=float)
+    if length is None and hasattr(source, 'shape'):
+        length = source.shape[0]
+    convolver = BlockConvolver(h)
+    
+    if output.endswith('.npy'):
+        if length is None:
+            raise ValueError("The length of x is needed to write a .npy file")
+        result = np.lib.format.open_memmap(output, mode='w+', dtype=dtype, shape=(length + h.size - 1,))
+        position = 0
+        for block in readBlocks(source, blockSize):
+            if cancelled is not None and cancelled():
+                raise ComputationCancelled()
+            result[position:position+block.size] = convolver.process(block)*step
+            position += block.size
+        if position != length:
+            raise ValueError("x has {} samples, {} expected".format(position, length))
+        result[position:] = convolver.flush()*step
+        result.flush()
+        del result
+        return np.load(output, mmap_mode='r')
+    
+    with open(output, 'wb') as outputFile:
+        for block in readBlocks(source, blockSize):
+            if cancelled is not None and cancelled():
+                raise ComputationCancelled()
+            outputFile.write((convolver.process(block)*step).astype(dtype).tobytes())
+        outputFile.write((convolver.flush()*step).astype(dtype).tobytes())
+    return np.memmap(output, dtype=dtype, mode='r')
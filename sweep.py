@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parameter sweeps of the convolution on a pool of processes.
+
+A grid gives a list of values for any key of Convolution.getSettings (tau,
+echoRate, points, XFunction, ...), 'rangeX' and 'rangeH' accept (min, max)
+pairs. Every combination is a case. The cases are sent by chunks to a pool
+of processes which write their numbers directly in shared memory : one row
+per case of the table below and, on request, the full convolutions.
+
+For each case the table compares the Riemann sum of the echos with the
+value of the convolution at tau.
+
+    python sweep.py grid.json --processes 4 --output table.csv
+
+Balayage de paramètres de la convolution sur plusieurs processus.
+
+License : GPL 3
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from convolution import Convolution
+
+COLUMNS = ('riemann', 'exact', 'error', 'relativeError', 'time')
+
+# Shared memory of the current sweep, attached once in each process
+shared = {}
+
+
+def parameterGrid(grid):
+    """List of the settings of every combination of the grid."""
+    keys = list(grid)
+    cases = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        settings = {}
+        for key, value in zip(keys, values):
+            if key in ('rangeX', 'rangeH'):
+                settings['min' + key[0].upper() + key[1:]], settings['max' + key[0].upper() + key[1:]] = value
+            else:
+                settings[key] = value
+        cases.append(settings)
+    return cases
+
+
+def resultSize(settings):
+    try:
+        points = int(settings.get('points', Convolution().getPoints()))
+    except (TypeError, ValueError):
+        # Reported by runCase
+        return 0
+    return max(2*points - 1, 0)
+
+
+def attach(tableName, tableShape, resultsName, resultsSize):
+    shared['tableMemory'] = shared_memory.SharedMemory(name=tableName)
+    shared['table'] = np.ndarray(tableShape, dtype=float, buffer=shared['tableMemory'].buf)
+    if resultsName is not None:
+        shared['resultsMemory'] = shared_memory.SharedMemory(name=resultsName)
+        shared['results'] = np.ndarray((resultsSize,), dtype=float, buffer=shared['resultsMemory'].buf)
+    else:
+        shared['results'] = None
+
+
+def runCase(case):
+    """Compute one case in a process of the pool, only its index and error go back.
+
+    A case that fails gets a row of nan, its error message is returned.
+    """
+    index, settings, offset = case
+    start = time.perf_counter()
+    try:
+        convolution = Convolution()
+        convolution.applySettings(settings)
+        result = convolution.getConvolution()[1]
+        riemann = convolution.getEchoProducts()['total']
+        tauIndex = int(((convolution.getTau()-convolution.getMinRangeX())/convolution.getStep()))
+        exact = result[min(max(tauIndex, 0), result.size-1)]
+        if shared['results'] is not None:
+            shared['results'][offset:offset+result.size] = result
+    except Exception as error:
+        # Invalid expressions, settings or sizes, the other cases still run
+        shared['table'][index] = np.nan
+        return index, '{}: {}'.format(type(error).__name__, error)
+    error = riemann - exact
+    # Undefined (nan, skipped by np.nanmean) when only the exact value is 0
+    if exact != 0:
+        relativeError = abs(error)/abs(exact)
+    else:
+        relativeError = 0.0 if error == 0 else np.nan
+    shared['table'][index] = (riemann, exact, error, relativeError, time.perf_counter() - start)
+    return index, None
+
+
+def runSweep(grid, processes=None, chunksize=None, keepResults=False):
+    """Compute every case of the grid.
+
+    Returns the table, a list with the settings and the columns of each
+    case, and the list of the convolutions when keepResults is True. The
+    columns of a case that failed are nan, its 'failure' key gives the error.
+    """
+    cases = parameterGrid(grid)
+    processes = processes or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(len(cases)//(4*processes), 1)
+    sizes = [resultSize(settings) for settings in cases]
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    
+    tableShape = (len(cases), len(COLUMNS))
+    tableMemory = shared_memory.SharedMemory(create=True, size=max(len(cases), 1)*len(COLUMNS)*8)
+    resultsMemory = None
+    if keepResults:
+        resultsMemory = shared_memory.SharedMemory(create=True, size=max(int(offsets[-1]), 1)*8)
+    try:
+        with ProcessPoolExecutor(processes, initializer=attach,
+                                 initargs=(tableMemory.name, tableShape,
+                                           resultsMemory.name if resultsMemory else None, int(offsets[-1]))) as pool:
+            errors = dict(pool.map(runCase, [(index, settings, offsets[index]) for index, settings in enumerate(cases)],
+                                   chunksize=chunksize))
+        table = np.ndarray(tableShape, dtype=float, buffer=tableMemory.buf).copy()
+        results = None
+        if keepResults:
+            allResults = np.ndarray((int(offsets[-1]),), dtype=float, buffer=resultsMemory.buf).copy()
+            results = [allResults[offsets[index]:offsets[index+1]] for index in range(len(cases))]
+    finally:
+        tableMemory.close()
+        tableMemory.unlink()
+        if resultsMemory is not None:
+            resultsMemory.close()
+            resultsMemory.unlink()
+    
+    rows = [dict(settings, **dict(zip(COLUMNS, values.tolist()))) for settings, values in zip(cases, table)]
+    for index, message in errors.items():
+        if message is not None:
+            rows[index]['failure'] = message
+    return rows, results
+
+
+def writeTable(rows, path):
+    keys = []
+    for row in rows:
+        keys += [key for key in row if key not in keys]
+    with open(path, 'w', newline='') as tableFile:
+        writer = csv.DictWriter(tableFile, fieldnames=keys)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Balayage de paramètres de la convolution")
+    parser.add_argument('grid', help="fichier JSON de la grille de paramètres")
+    parser.add_argument('--processes', type=int, help="nombre de processus")
+    parser.add_argument('--chunksize', type=int, help="nombre de cas envoyés à la fois à un processus")
+    parser.add_argument('--output', default='sweep.csv', help="fichier CSV du tableau des résultats")
+    arguments = parser.parse_args(argv)
+    with open(arguments.grid) as gridFile:
+        grid = json.load(gridFile)
+    start = time.perf_counter()
+    rows, results = runSweep(grid, arguments.processes, arguments.chunksize)
+    writeTable(rows, arguments.output)
+    failed = [row for row in rows if 'failure' in row]
+    for row in failed:
+        print('erreur : {}'.format(row['failure']), file=sys.stderr)
+    print('{} cas en {:.3f} s, {} en erreur -> {}'.format(len(rows), time.perf_counter() - start,
+                                                         len(failed), arguments.output))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+import analytic
+from convolution import Convolution
+
+CASES = [('(t >= 2)*(t < 5)', 'exp(-t)'),
+         ('hstack((zeros(4000), ones(6000), zeros(10000)))', 'exp(-2*t)'),
+         ('sin(t)', 'exp(-t)'),
+         ('exp(-0.5*t)*(t > 1)', 'cos(2*t+1)'),
+         ('3', '(t < 4) - 0.5*(t > 6)')]
+
+
+def closedForm(convolution):
+    pieces = convolution.getPieces()
+    assert pieces is not None
+    return analytic.convolvePieces(*pieces, convolution.getConvolution()[0])
+
+
+@pytest.mark.parametrize('x, h', CASES)
+def test_closed_form_matches_numeric(x, h):
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': x, 'HFunction': h, 'points': 20000,
+                               'minRangeH': 0, 'maxRangeH': 10, 'analytic': False})
+    numeric = convolution.getConvolution()[1]
+    convolution.setAnalytic(True)
+    exact = closedForm(convolution)
+    # Sampling the steps costs about one step of error
+    scale = np.abs(numeric).max() or 1
+    assert np.abs(exact - numeric).max() <= 2e-3*scale
+
+
+def test_closed_form_at_a_time():
+    convolution = Convolution()
+    convolution.setHFunction('exp(-t)')
+    # (t >= 2)*(t < 5) convolved with exp(-t), at t = 3
+    assert convolution.getConvolutionAt(3) == pytest.approx(1 - np.exp(-1), rel=1e-12)
+
+
+def test_closed_form_chunks_and_out():
+    xPieces = analytic.analyzeExpression('sin(t)', 0, 10)
+    hPieces = analytic.analyzeExpression('exp(-t)', 0, 10)
+    t = np.linspace(0, 20, 3*analytic.CHUNK + 5)
+    expected = analytic.convolvePieces(xPieces, hPieces, t)
+    out = np.empty(t.size, dtype=np.float32)
+    assert analytic.convolvePieces(xPieces, hPieces, t, out) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_closed_form_cancelled():
+    from engine import ComputationCancelled
+    pieces = analytic.analyzeExpression('sin(t) + (t > 1)', 0, 10)
+    with pytest.raises(ComputationCancelled):
+        analytic.convolvePieces(pieces, pieces, np.linspace(0, 20, 100), cancelled=lambda: True)
+
+
+def test_forced_engine_is_numeric():
+    convolution = Convolution()
+    convolution.setEngine('direct')
+    assert convolution.getPieces() is None
+
+
+def test_unequal_ranges_are_numeric():
+    convolution = Convolution()
+    convolution.setRangeH(0, 5)
+    assert convolution.getPieces() is None
+
+
+def test_costly_closed_form_is_numeric():
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': '+'.join('sin({}*t)'.format(k) for k in range(1, 9)),
+                               'HFunction': '+'.join('cos({}*t)*exp(-t)'.format(k) for k in range(1, 9)),
+                               'points': 100000})
+    convolution.getConvolution()
+    assert convolution.getPieces() is not None
+    assert convolution.getClosedForm() is None
+
+
+@pytest.mark.parametrize('source', ['tan(t)', 't**2', 'exp(t**2)', 'zeros(10)+t'])
+def test_not_analytic(source):
+    assert analytic.analyzeExpression(source, 0, 10) is None
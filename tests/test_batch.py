@@ -0,0 +1,30 @@
+import numpy as np
+
+import engine
+from convolution import Convolution
+
+
+def test_batch_matches_rows():
+    generator = np.random.default_rng(1)
+    xs = generator.standard_normal((4, 2000))
+    h = generator.standard_normal(300)
+    results = engine.batchConvolve(xs, h)
+    for x, result in zip(xs, results):
+        np.testing.assert_allclose(result, np.convolve(x, h), rtol=1e-9, atol=1e-9)
+
+
+def test_batch_keeps_float32():
+    xs = np.ones((3, 500), dtype=np.float32)
+    h = np.exp(-np.linspace(0, 5, 100, dtype=np.float32))
+    results = engine.batchConvolve(xs, h)
+    assert results.dtype == np.float32
+    np.testing.assert_allclose(results[0], np.convolve(xs[0].astype(float), h.astype(float)), rtol=1e-4, atol=1e-4)
+
+
+def test_batch_convolution_in_float32_mode():
+    convolution = Convolution()
+    convolution.applySettings({'dtype': 'float32', 'analytic': False})
+    x = convolution.getXfunction()[1]
+    t, results = convolution.getBatchConvolution(np.vstack((x, 2*x)))
+    assert results.dtype == np.float32
+    np.testing.assert_allclose(results[1], 2*convolution.getConvolution()[1], rtol=1e-4, atol=1e-5)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from cache import LRUCache, sizeOf
+
+
+def test_size_of():
+    array = np.zeros(100)
+    assert sizeOf(array) == 800
+    assert sizeOf({'a': array, 'b': [array, (array, 1)], 'c': 'text'}) == 2400
+    assert sizeOf(None) == 0
+
+
+def test_least_recently_used_evicted():
+    cache = LRUCache(3*800)
+    for key in 'abc':
+        cache.put(key, np.zeros(100))
+    assert cache.get('a') is not None
+    cache.put('d', np.zeros(100))
+    assert 'b' not in cache
+    assert set(cache.entries) == {'a', 'c', 'd'}
+    assert cache.currentBytes == 3*800
+
+
+def test_hits_and_misses():
+    cache = LRUCache(1000)
+    value = np.ones(10)
+    assert cache.put('a', value) is value
+    assert cache.get('a') is value
+    assert cache.get('b', 'default') == 'default'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_replace_and_clear():
+    cache = LRUCache(2000)
+    cache.put('a', np.zeros(100))
+    cache.put('a', np.zeros(200))
+    assert len(cache) == 1 and cache.currentBytes == 1600
+    cache.clear()
+    assert len(cache) == 0 and cache.currentBytes == 0
+
+
+def test_too_large_not_kept():
+    cache = LRUCache(100)
+    cache.put('small', np.zeros(10))
+    value = cache.put('large', np.zeros(100))
+    assert value.size == 100
+    assert 'large' not in cache and 'small' in cache
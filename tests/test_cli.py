@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pytest
+
+import cli
+from expression import ExpressionError, compileExpression
+
+
+def runMain(tmp_path, jobs):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps(jobs))
+    return cli.main(['--jobs', str(path), '--output', str(tmp_path / 'results')])
+
+
+def test_single_job(tmp_path):
+    status = cli.main(['--x', 'sin(t)', '--h', 'exp(-t)', '--points', '5000', '--output', str(tmp_path)])
+    assert status == 0
+    table = np.load(tmp_path / 'convolution.npy')
+    assert table.shape == (2, 9999)
+
+
+def test_failed_jobs_do_not_stop_the_batch(tmp_path, capsys):
+    jobs = [{'name': 'shape', 'XFunction': 'hstack((zeros(2), ones(3)))'},
+            {'name': 'number', 'XFunction': 5},
+            {'name': 'null', 'points': None},
+            {'name': 'unknown', 'XFunction': 'foo(t)'},
+            [1, 2],
+            {'name': 'good', 'x': 'sin(t)', 'points': 200}]
+    assert runMain(tmp_path, jobs) == 1
+    errors = capsys.readouterr().err
+    for name in ('shape', 'number', 'null', 'unknown', 'convolution0004'):
+        assert name + ': erreur' in errors
+    assert 'good: clés inconnues ignorées : x' in errors
+    assert (tmp_path / 'results' / 'good.npy').exists()
+
+
+def test_csv_output(tmp_path):
+    output = cli.runJob({'name': 'job', 'points': 100})
+    path = cli.writeResult(output, str(tmp_path), 'csv')
+    table = np.loadtxt(path, delimiter=',', skiprows=1)
+    np.testing.assert_allclose(table[:, 1], output['result'][1])
+
+
+def test_non_string_expression():
+    with pytest.raises(ExpressionError):
+        compileExpression(5, {'t'})
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+import engine
+from convolution2d import Convolution2D
+from expression import ExpressionError
+
+
+def directConvolve2d(x, h):
+    result = np.zeros((x.shape[0] + h.shape[0] - 1, x.shape[1] + h.shape[1] - 1))
+    for i in range(h.shape[0]):
+        for j in range(h.shape[1]):
+            result[i:i+x.shape[0], j:j+x.shape[1]] += h[i, j]*x
+    return result
+
+
+@pytest.fixture
+def random():
+    return np.random.default_rng(20)
+
+
+def test_separate_kernel(random):
+    column, row = random.standard_normal(7), random.standard_normal(5)
+    factors = engine.separateKernel(np.outer(column, row))
+    assert factors is not None
+    np.testing.assert_allclose(np.outer(*factors), np.outer(column, row), atol=1e-12)
+    assert engine.separateKernel(random.standard_normal((7, 5))) is None
+    assert engine.separateKernel(np.zeros((0, 3))) is None
+    column, row = engine.separateKernel(np.zeros((2, 3)))
+    assert not column.any() and not row.any()
+
+
+@pytest.mark.parametrize('method', engine.ENGINES_2D)
+def test_convolve2d_separable(random, method):
+    x = random.standard_normal((30, 40))
+    h = np.outer(random.standard_normal(6), random.standard_normal(9))
+    np.testing.assert_allclose(engine.convolve2d(x, h, method), directConvolve2d(x, h), atol=1e-10)
+
+
+def test_convolve2d_not_separable(random):
+    x = random.standard_normal((30, 40))
+    h = random.standard_normal((6, 9))
+    np.testing.assert_allclose(engine.convolve2d(x, h), directConvolve2d(x, h), atol=1e-10)
+    with pytest.raises(ValueError):
+        engine.convolve2d(x, h, 'separable')
+    with pytest.raises(ValueError):
+        engine.convolve2d(x, h, 'direct')
+
+
+def test_convolve2d_float32(random):
+    x = random.standard_normal((20, 20)).astype(np.float32)
+    h = np.outer(np.ones(3), np.ones(4)).astype(np.float32)
+    assert engine.convolve2d(x, h).dtype == np.float32
+
+
+def test_default_images():
+    convolution = Convolution2D()
+    convolution.setPoints(101)
+    assert convolution.isSeparable()
+    u, v, result = convolution.getConvolution()
+    x = convolution.getXfunction()[2]
+    h = convolution.getHfunction()[2]
+    assert result.shape == (x.shape[0] + h.shape[0] - 1,)*2
+    np.testing.assert_allclose(result, directConvolve2d(x, h)*convolution.getStep()**2, atol=1e-10)
+    # The integral of the result is the product of the integrals
+    step2 = convolution.getStep()**2
+    np.testing.assert_allclose(result.sum()*step2, x.sum()*step2*h.sum()*step2, rtol=1e-10)
+
+
+def test_engines_agree():
+    convolution = Convolution2D()
+    convolution.applySettings({'points': 81, 'HFunction': 'exp(-(u**2+v**2))*(1 + u*v)'})
+    assert not convolution.isSeparable()
+    auto = convolution.getConvolution()[2].copy()
+    convolution.setEngine('fft')
+    np.testing.assert_allclose(convolution.getConvolution()[2], auto)
+    convolution.setEngine('separable')
+    with pytest.raises(ValueError):
+        convolution.getConvolution()
+
+
+def test_probe_products():
+    convolution = Convolution2D()
+    convolution.applySettings({'points': 81, 'probe': (1.0, -0.5)})
+    products = convolution.getProbeProducts()
+    assert products['probe'] == (1.0, -0.5)
+    np.testing.assert_allclose(products['total'], products['value'], rtol=1e-10)
+    u, v, result = convolution.getConvolution()
+    row, column = products['index']
+    np.testing.assert_allclose(u[0, column], 1.0, atol=convolution.getStep()/2)
+    np.testing.assert_allclose(v[row, 0], -0.5, atol=convolution.getStep()/2)
+
+
+def test_stages():
+    convolution = Convolution2D()
+    convolution.setPoints(51)
+    convolution.getProbeProducts()
+    version = convolution.getVersion('convolution')
+    convolution.setProbe(0.5, 0.5)
+    convolution.getProbeProducts()
+    assert convolution.getVersion('convolution') == version
+    convolution.setHFunction('exp(-(u**2+v**2)/2)')
+    convolution.getProbeProducts()
+    assert convolution.getVersion('convolution') == version + 1
+
+
+def test_invalid_inputs():
+    convolution = Convolution2D()
+    with pytest.raises(ExpressionError):
+        convolution.setXFunction('t + u')
+    assert convolution.getXFunctionString() == '(abs(u) < 2)*(abs(v) < 1)'
+    with pytest.raises(ValueError):
+        convolution.setPoints(1)
+    with pytest.raises(ValueError):
+        convolution.setRangeX(1, 1)
+    with pytest.raises(ValueError):
+        convolution.setRangeH(1, 0)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from convolution import Convolution
+from decimation import decimate, lttbIndices, minMaxIndices
+from timeaxis import TimeAxis
+
+
+@pytest.fixture
+def curve():
+    t = np.linspace(0, 10, 100003)
+    random = np.random.default_rng(8)
+    return t, np.sin(t) + 0.1*random.standard_normal(t.size)
+
+
+def test_minmax_keeps_the_envelope(curve):
+    t, y = curve
+    indices = minMaxIndices(y, 500)
+    assert indices.size <= 2*500 + 2
+    assert indices[0] == 0 and indices[-1] == y.size - 1
+    assert np.all(np.diff(indices) > 0)
+    assert y[indices].min() == y.min() and y[indices].max() == y.max()
+    # The extremes of every bucket are kept
+    size = -(-y.size // 500)
+    for bucket in (0, 123, y.size // size - 1):
+        part = y[bucket*size:(bucket+1)*size]
+        assert part.min() in y[indices] and part.max() in y[indices]
+
+
+def test_minmax_small_and_flat():
+    np.testing.assert_array_equal(minMaxIndices(np.arange(10.0), 5), np.arange(10))
+    np.testing.assert_array_equal(minMaxIndices(np.ones(1000), 0), np.arange(1000))
+    indices = minMaxIndices(np.ones(1000), 10)
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb(curve):
+    t, y = curve
+    indices = lttbIndices(t, y, 800)
+    assert indices.size == 800
+    assert indices[0] == 0 and indices[-1] == y.size - 1
+    assert np.all(np.diff(indices) > 0)
+    np.testing.assert_array_equal(lttbIndices(t[:100], y[:100], 800), np.arange(100))
+
+
+@pytest.mark.parametrize('method', ('minmax', 'lttb'))
+def test_decimate(curve, method):
+    t, y = curve
+    shownT, shownY = decimate(t, y, 400, method)
+    assert shownT.size == shownY.size <= 2*400 + 2
+    np.testing.assert_array_equal(np.interp(shownT, t, y), shownY)
+
+
+def test_decimate_lazy_axis():
+    t = TimeAxis(-5.0, 0.001, 100000)
+    y = np.cos(np.asarray(t))
+    shownT, shownY = decimate(t, y, 300)
+    np.testing.assert_allclose(shownT, np.asarray(t)[minMaxIndices(y, 300)])
+
+
+@pytest.mark.parametrize('points', (2, 999, 1000, 12345))
+def test_default_at_any_point_count(points):
+    convolution = Convolution()
+    convolution.setPoints(points)
+    t, x = convolution.getXfunction()
+    assert x.size == t.size
+    assert convolution.getConvolution()[1].size == x.size + convolution.getHfunction()[1].size - 1
+
+
+def test_points():
+    convolution = Convolution()
+    with pytest.raises(ValueError):
+        convolution.setPoints(1)
+    convolution.setPoints(4000)
+    assert convolution.getPoints() == 4000
+    assert convolution.getXfunction()[1].size == 4000
@@ -0,0 +1,63 @@
+import os
+import time
+
+import numpy as np
+
+from convolution import Convolution
+from diskcache import DiskCache, keyDigest
+
+
+def test_put_and_get(tmp_path):
+    cache = DiskCache(str(tmp_path), minBytes=0)
+    value = np.arange(1000.0)
+    cache.put(('x', 1), value)
+    stored = cache.get(('x', 1))
+    np.testing.assert_array_equal(stored, value)
+    assert not stored.flags.writeable
+    assert cache.get(('x', 2)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert ('x', 1) in cache and len(cache) == 1
+
+
+def test_small_and_object_arrays_are_not_stored(tmp_path):
+    cache = DiskCache(str(tmp_path), minBytes=1024)
+    cache.put('small', np.zeros(10))
+    cache.put('objects', np.array([None]*1000, dtype=object))
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    size = np.zeros(1000).nbytes + 128
+    cache = DiskCache(str(tmp_path), maxBytes=3*size, minBytes=0)
+    for key in range(3):
+        cache.put(key, np.zeros(1000))
+    # The modification time is the time of the last use, 1 is the oldest
+    now = time.time()
+    for key, age in ((0, 0), (1, 30), (2, 20)):
+        os.utime(cache.path(key), (now - age, now - age))
+    cache.put(3, np.zeros(1000))
+    assert 1 not in cache
+    assert all(key in cache for key in (0, 2, 3))
+    assert cache.size() <= 3*size
+
+
+def test_keys_of_equal_numbers_match():
+    assert keyDigest((0, 10, 1000)) == keyDigest((0.0, 10.0, 1000.0))
+    assert keyDigest(np.float32(0.5)) == keyDigest(0.5)
+    assert keyDigest(True) != keyDigest(1)
+    window = Convolution()
+    commandLine = Convolution()
+    commandLine.setRangeX(0.0, 10.0)
+    commandLine.setRangeH(0.0, 10.0)
+    assert keyDigest(window.stageKey('convolution')) == keyDigest(commandLine.stageKey('convolution'))
+
+
+def test_convolution_reads_the_cache(tmp_path):
+    cache = DiskCache(str(tmp_path), minBytes=0)
+    first = Convolution()
+    first.diskCache = cache
+    expected = np.array(first.getConvolution()[1])
+    second = Convolution()
+    second.diskCache = cache
+    np.testing.assert_array_equal(second.getConvolution()[1], expected)
+    assert cache.hits == 3
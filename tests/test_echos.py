@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from convolution import Convolution
+
+
+def referenceEchos(convolution):
+    """Echos, products and Riemann sum as computed by the loop of the first version."""
+    x = np.asarray(convolution.getXfunction()[1])
+    h = np.asarray(convolution.getHfunction()[1])
+    rangeH = np.linspace(convolution.getMinRangeH(), convolution.getMaxRangeH(), convolution.getPoints())
+    tau, step, echoPoints = convolution.getTau(), convolution.getStep(), convolution.getEchoPoints()
+    minX, minH = convolution.getMinRangeX(), convolution.getMinRangeH()
+    numberOfEchos = np.floor((tau-minX)/(step*echoPoints))
+    echos = [tau - echo*(step*echoPoints) for echo in np.arange(0, numberOfEchos)]
+    tauIndex = int(((tau-minX)/step))
+    total = h[0]*x[tauIndex]*echoPoints*step
+    intersections = []
+    for i, echo in enumerate(echos):
+        after = np.nonzero(echo-minX+minH < rangeH)[0]
+        if after.size == 0 or i*echoPoints >= x.size:
+            intersection = 0
+        else:
+            intersection = x[i*echoPoints]*h[after[0]]
+        intersections.append(intersection)
+        if intersection > 0:
+            total += intersection*echoPoints*step
+    return np.array(echos), np.array(intersections), total
+
+
+@pytest.mark.parametrize('x', ['(t >= 2)*(t < 5)', 'sin(t)'])
+@pytest.mark.parametrize('tau', [0.5, 1, 3.33, 7, 9.99])
+@pytest.mark.parametrize('echoRate', [1, 7, 50, 300])
+@pytest.mark.parametrize('rangeH', [(0, 10), (-2, 8)])
+def test_echos_match_loop(x, tau, echoRate, rangeH):
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': x, 'HFunction': 'exp(-t)', 'tau': tau, 'echoRate': echoRate,
+                               'minRangeH': rangeH[0], 'maxRangeH': rangeH[1]})
+    echos, intersections, total = referenceEchos(convolution)
+    products = convolution.getEchoProducts()
+    np.testing.assert_allclose(products['echos'], echos, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(products['intersections'], intersections, rtol=1e-12, atol=1e-15)
+    assert products['total'] == pytest.approx(total, rel=1e-12, abs=1e-15)
+
+
+def test_echos_lean_axis():
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': 'sin(t)', 'tau': 6.1, 'echoRate': 40, 'minRangeH': -1, 'maxRangeH': 9})
+    expected = convolution.getEchoProducts()
+    convolution.setLean(True)
+    products = convolution.getEchoProducts()
+    np.testing.assert_array_equal(products['hIndex'], expected['hIndex'])
+    assert products['total'] == pytest.approx(expected['total'], rel=1e-12)
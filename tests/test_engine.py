@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import engine
+
+SIZES = [(1, 1), (5, 3), (3, 5), (1000, 37), (3000, 2500), (70000, 300)]
+
+
+@pytest.mark.parametrize('method', engine.ENGINES)
+@pytest.mark.parametrize('n, m', SIZES)
+def test_engine_matches_np_convolve(method, n, m):
+    generator = np.random.default_rng(n*m)
+    x = generator.standard_normal(n)
+    h = generator.standard_normal(m)
+    expected = np.convolve(x, h)
+    result = engine.convolve(x, h, method)
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-9*np.abs(expected).max())
+
+
+@pytest.mark.parametrize('method', engine.ENGINES)
+def test_engine_writes_out(method):
+    x = np.linspace(0, 1, 5000)
+    h = np.exp(-np.linspace(0, 5, 800))
+    out = np.empty(x.size + h.size - 1)
+    result = engine.convolve(x, h, method, out=out)
+    assert result is out
+    np.testing.assert_allclose(out, np.convolve(x, h), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('method', engine.ENGINES)
+def test_engine_keeps_float32(method):
+    x = np.linspace(0, 1, 4000, dtype=np.float32)
+    h = np.exp(-np.linspace(0, 5, 600, dtype=np.float32))
+    result = engine.convolve(x, h, method)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, np.convolve(x.astype(float), h.astype(float)), rtol=1e-4, atol=1e-3)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        engine.convolve(np.ones(3), np.ones(3), 'fast')
+
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from cache import LRUCache
+from expression import (ExpressionError, compileExpression, evaluateExpression,
+                        safeDictionary, sampleExpression)
+
+NAMES = set(safeDictionary()) | {'t'}
+
+
+def evaluate(source, t):
+    return evaluateExpression(compileExpression(source, NAMES), safeDictionary(), t)
+
+
+def test_evaluate():
+    t = np.linspace(0, 1, 11)
+    np.testing.assert_allclose(evaluate('exp(-t)*sin(2*pi*t)', t), np.exp(-t)*np.sin(2*np.pi*t))
+    np.testing.assert_array_equal(evaluate('3', t), np.full(11, 3.0))
+    np.testing.assert_array_equal(evaluate('hstack((zeros(5), ones(6)))', t), np.r_[np.zeros(5), np.ones(6)])
+
+
+@pytest.mark.parametrize('source', ('sin(', 'os.system("ls")', '__import__("os")', 'open("file")',
+                                    't.__class__', 'lambda: 1', '(y := 1)', 'u'))
+def test_rejected(source):
+    with pytest.raises(ExpressionError):
+        compileExpression(source, NAMES)
+
+
+@pytest.mark.parametrize('source', (None, 5, ['sin(t)']))
+def test_not_a_string(source):
+    with pytest.raises(ExpressionError):
+        compileExpression(source, NAMES)
+
+
+def test_evaluation_errors():
+    t = np.linspace(0, 1, 11)
+    with pytest.raises(ExpressionError):
+        evaluate('zeros(3)', t)
+    with pytest.raises(ExpressionError):
+        evaluate('hstack(1)', t)
+    # ExpressionError is a ValueError for the callers that only know the latter
+    assert issubclass(ExpressionError, ValueError)
+
+
+def test_sample_cache():
+    cache = LRUCache(2**20)
+    code = compileExpression('sin(t)', NAMES)
+    t = np.linspace(0, 1, 101)
+    first = sampleExpression(cache, code, 'sin(t)', safeDictionary(), t, 0, 1)
+    second = sampleExpression(cache, code, 'sin(t)', safeDictionary(), t, 0, 1)
+    assert second is first
+    assert not first.flags.writeable
+    other = sampleExpression(cache, code, 'sin(t)', safeDictionary(), t, 0, 1, np.float32)
+    assert other.dtype == np.float32 and len(cache) == 2
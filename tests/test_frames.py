@@ -0,0 +1,56 @@
+import numpy as np
+
+from convolution import Convolution
+from frames import FrameCache, FramePrecomputer, FrameRaster, FrameRasterizer
+
+
+def precompute(convolution, taus, raster=None):
+    cache = FrameCache()
+    precomputer = FramePrecomputer(cache)
+    precomputer.start(convolution, taus, raster)
+    precomputer.future.result()
+    precomputer.shutdown()
+    return cache
+
+
+def frameOf(cache, convolution, tau):
+    snapshot = convolution.snapshot()
+    snapshot.setTau(tau)
+    return cache.get(snapshot.stageKey('echos'))
+
+
+def test_precomputed_frames():
+    convolution = Convolution()
+    taus = [-1.0, 0.0, 1.5]
+    cache = precompute(convolution, taus)
+    assert len(cache) == len(taus)
+    for tau in taus:
+        assert 'raster' not in frameOf(cache, convolution, tau)
+
+
+def test_background_raster():
+    convolution = Convolution()
+    rasterizer = FrameRasterizer((4, 3), 50)
+    shownX, shownH = convolution.getXfunction(), convolution.getHfunction()
+    raster = FrameRaster(rasterizer, shownX, shownH, (-1, 2))
+    cache = precompute(convolution, [0.5, 2.0], raster)
+    frame = frameOf(cache, convolution, 2.0)
+    assert frame['rasterKey'] == raster.key
+    assert frame['raster'].shape == (150, 200, 4)
+    # The same image as a rendering on this thread
+    snapshot = convolution.snapshot()
+    snapshot.setTau(2.0)
+    image = FrameRasterizer((4, 3), 50).rasterize(snapshot, shownX, shownH, (-1, 2), frame)
+    np.testing.assert_array_equal(frame['raster'], image)
+
+
+def test_raster_added_to_cached_frames():
+    convolution = Convolution()
+    cache = precompute(convolution, [1.0])
+    raster = FrameRaster(FrameRasterizer((4, 3), 50), convolution.getXfunction(),
+                         convolution.getHfunction(), (-1, 2), modeEcho=False)
+    precomputer = FramePrecomputer(cache)
+    precomputer.start(convolution, [1.0], raster)
+    precomputer.future.result()
+    precomputer.shutdown()
+    assert frameOf(cache, convolution, 1.0)['rasterKey'] == (False, (4.0, 3.0), 50)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from convolution import Convolution
+from timeaxis import TimeAxis
+
+
+def computeOnWorker(convolution):
+    snapshot = convolution.snapshot(buffers=True)
+    snapshot.compute()
+    convolution.adopt(snapshot)
+    return convolution.getConvolution()[1]
+
+
+def test_lean_matches_default():
+    lean = Convolution()
+    lean.applySettings({'XFunction': 'sin(t)', 'points': 5000, 'lean': True, 'analytic': False})
+    default = Convolution()
+    default.applySettings({'XFunction': 'sin(t)', 'points': 5000, 'analytic': False})
+    assert isinstance(lean.getConvolution()[0], TimeAxis)
+    np.testing.assert_array_equal(lean.getConvolution()[1], default.getConvolution()[1])
+    np.testing.assert_allclose(np.asarray(lean.getConvolution()[0]), default.getConvolution()[0], rtol=1e-15)
+
+
+def test_float32():
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': 'sin(t)', 'points': 5000, 'dtype': 'float32', 'analytic': False})
+    result = convolution.getConvolution()[1]
+    assert result.dtype == np.float32
+    reference = Convolution()
+    reference.applySettings({'XFunction': 'sin(t)', 'points': 5000, 'analytic': False})
+    np.testing.assert_allclose(result, reference.getConvolution()[1], rtol=1e-4, atol=1e-4)
+
+
+def test_worker_results_alternate_between_two_buffers():
+    convolution = Convolution()
+    convolution.applySettings({'points': 30000, 'lean': True, 'analytic': False})
+    results = []
+    for expression in ('sin(t)', 'cos(t)', 'sin(2*t)', 'cos(2*t)'):
+        convolution.setXFunction(expression)
+        result = computeOnWorker(convolution)
+        reference = Convolution()
+        reference.applySettings({'XFunction': expression, 'points': 30000, 'analytic': False})
+        np.testing.assert_array_equal(result, reference.getConvolution()[1])
+        results.append(result)
+    assert results[0] is results[2] and results[1] is results[3]
+    assert results[0] is not results[1]
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from session import SessionError, loadSession, saveSession
+
+
+def writeSession(path, session):
+    path.write_text(json.dumps(session))
+    return str(path)
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'session.json')
+    settings = {'XFunction': 'sin(t)', 'minRangeX': -1, 'maxRangeX': 4, 'points': 500, 'tau': 2.5}
+    saveSession(path, settings, {'modeEcho': False})
+    assert loadSession(path) == (settings, {'modeEcho': False})
+
+
+@pytest.mark.parametrize('session', [
+    [1, 2],
+    {'version': 2, 'convolution': {}},
+    {'version': 1, 'convolution': [1, 2]},
+    {'version': 1, 'convolution': {}, 'interface': 'echo'},
+    {'version': 1, 'convolution': {'XFunction': 5}},
+    {'version': 1, 'convolution': {'XFunction': 'foo(t)'}},
+    {'version': 1, 'convolution': {'points': None}},
+    {'version': 1, 'convolution': {'points': 1}},
+    {'version': 1, 'convolution': {'maxRangeX': 0}},
+    {'version': 1, 'convolution': {'minRangeH': 3, 'maxRangeH': 3}},
+])
+def test_invalid_sessions(tmp_path, session):
+    with pytest.raises(SessionError):
+        loadSession(writeSession(tmp_path / 'session.json', session))
+
+
+def test_unreadable_session(tmp_path):
+    path = tmp_path / 'session.json'
+    path.write_text('{not json')
+    with pytest.raises(SessionError):
+        loadSession(str(path))
+    with pytest.raises(SessionError):
+        loadSession(str(tmp_path / 'missing.json'))
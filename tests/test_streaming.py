@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from convolution import Convolution
+from engine import ComputationCancelled
+from streaming import streamConvolve
+
+
+@pytest.fixture
+def signals():
+    random = np.random.default_rng(12)
+    return random.standard_normal(10000), random.standard_normal(300)
+
+
+def test_npy_output(tmp_path, signals):
+    x, h = signals
+    result = streamConvolve(x, h, str(tmp_path / 'y.npy'), step=0.5, blockSize=1000)
+    assert isinstance(result, np.memmap)
+    np.testing.assert_allclose(result, np.convolve(x, h)*0.5, atol=1e-10)
+
+
+def test_npy_input(tmp_path, signals):
+    x, h = signals
+    np.save(tmp_path / 'x.npy', x)
+    result = streamConvolve(str(tmp_path / 'x.npy'), h, str(tmp_path / 'y.npy'), blockSize=777)
+    np.testing.assert_allclose(result, np.convolve(x, h), atol=1e-10)
+
+
+def test_raw_files(tmp_path, signals):
+    x, h = signals
+    x.astype(np.float32).tofile(tmp_path / 'x.raw')
+    result = streamConvolve(str(tmp_path / 'x.raw'), h, str(tmp_path / 'y.raw'), dtype=np.float32)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, np.convolve(x.astype(np.float32), h), rtol=1e-4, atol=1e-3)
+
+
+def test_generator(tmp_path, signals):
+    x, h = signals
+    blocks = (x[start:start+1234] for start in range(0, x.size, 1234))
+    result = streamConvolve(blocks, h, str(tmp_path / 'y.npy'), length=x.size)
+    np.testing.assert_allclose(result, np.convolve(x, h), atol=1e-10)
+
+
+def test_generator_length(tmp_path, signals):
+    x, h = signals
+    with pytest.raises(ValueError):
+        streamConvolve(iter([x]), h, str(tmp_path / 'y.npy'))
+    with pytest.raises(ValueError):
+        streamConvolve(iter([x]), h, str(tmp_path / 'y.npy'), length=x.size + 1)
+
+
+def test_cancelled(tmp_path, signals):
+    x, h = signals
+    with pytest.raises(ComputationCancelled):
+        streamConvolve(x, h, str(tmp_path / 'y.raw'), cancelled=lambda: True)
+
+
+def test_convolution_stream(tmp_path):
+    convolution = Convolution()
+    convolution.applySettings({'XFunction': 'sin(t)', 'points': 2000, 'analytic': False})
+    x = convolution.getXfunction()[1]
+    result = convolution.getStreamConvolution(x, str(tmp_path / 'y.npy'), blockSize=300)
+    np.testing.assert_allclose(result, convolution.getConvolution()[1], atol=1e-9)
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+
+import sweep
+from convolution import Convolution
+
+
+def test_parameter_grid():
+    cases = sweep.parameterGrid({'tau': [1, 2], 'rangeX': [(0, 5)]})
+    assert cases == [{'tau': 1, 'minRangeX': 0, 'maxRangeX': 5}, {'tau': 2, 'minRangeX': 0, 'maxRangeX': 5}]
+
+
+def test_sweep_matches_convolution():
+    rows, results = sweep.runSweep({'tau': [1, 3.5], 'echoRate': [1, 20]}, processes=2, keepResults=True)
+    assert len(rows) == 4 and len(results) == 4
+    for row, result in zip(rows, results):
+        convolution = Convolution()
+        convolution.applySettings({'tau': row['tau'], 'echoRate': row['echoRate']})
+        np.testing.assert_array_equal(result, convolution.getConvolution()[1])
+        assert row['riemann'] == convolution.getEchoProducts()['total']
+        assert np.isfinite(row['relativeError'])
+    # tau = 1 is before the step of x, both values are 0
+    assert rows[0]['exact'] == 0 and rows[0]['relativeError'] == 0
+
+
+def test_failed_cases_do_not_stop_the_sweep(tmp_path, capsys):
+    grid = {'XFunction': ['sin(t)', 'foo(t)', 'hstack((zeros(2), ones(3)))'], 'points': [500]}
+    rows, results = sweep.runSweep(grid, processes=2)
+    assert 'failure' not in rows[0] and np.isfinite(rows[0]['riemann'])
+    for row in rows[1:]:
+        assert 'Error' in row['failure']
+        assert all(np.isnan(row[column]) for column in sweep.COLUMNS)
+    path = tmp_path / 'grid.json'
+    path.write_text(json.dumps(grid))
+    assert sweep.main([str(path), '--processes', '2', '--output', str(tmp_path / 'table.csv')]) == 1
+    assert capsys.readouterr().err.count('erreur') == 2
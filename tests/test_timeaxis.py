@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from timeaxis import TimeAxis
+
+AXES = [(0, 10, 1000), (-3.5, 7.25, 1001), (0, 1, 2), (2, 2.5, 100007), (-1e-3, 1e3, 12345)]
+
+
+@pytest.mark.parametrize('start, stop, size', AXES)
+def test_values_match_linspace(start, stop, size):
+    axis = TimeAxis(start, stop, size)
+    expected = np.linspace(start, stop, size)
+    np.testing.assert_array_equal(np.asarray(axis), expected)
+    np.testing.assert_allclose(axis.values(np.arange(size)), expected, rtol=1e-15, atol=1e-12)
+    assert axis[-1] == expected[-1]
+    assert axis[0] == expected[0]
+
+
+@pytest.mark.parametrize('start, stop, size', AXES)
+def test_indexing_matches_linspace(start, stop, size):
+    axis = TimeAxis(start, stop, size)
+    expected = np.linspace(start, stop, size)
+    for key in (slice(None), slice(1, None, 3), slice(None, None, -2), slice(-5, None)):
+        np.testing.assert_allclose(axis[key], expected[key], rtol=1e-15, atol=1e-12)
+    indices = np.array([0, size - 1, -1, size//2, -size])
+    np.testing.assert_allclose(axis[indices], expected[indices], rtol=1e-15, atol=1e-12)
+    mask = np.arange(size) % 3 == 0
+    np.testing.assert_allclose(axis[mask], expected[mask], rtol=1e-15, atol=1e-12)
+    with pytest.raises(IndexError):
+        axis[size]
+
+
+def test_take_matches_np_take():
+    axis = TimeAxis(-2, 3, 501)
+    expected = np.linspace(-2, 3, 501)
+    indices = np.array([0, 7, 500, -1])
+    np.testing.assert_allclose(np.take(axis, indices), np.take(expected, indices), rtol=1e-15)
+    wrapped = np.array([501, 1003, -502])
+    np.testing.assert_allclose(np.take(axis, wrapped, mode='wrap'), np.take(expected, wrapped, mode='wrap'),
+                               rtol=1e-15)
+    np.testing.assert_allclose(np.take(axis, wrapped, mode='clip'), np.take(expected, wrapped, mode='clip'))
+    out = np.empty(4)
+    assert np.take(axis, indices, out=out) is out
+
+
+def test_take_does_not_build_the_axis(monkeypatch):
+    def fail(*arguments, **keywords):
+        raise AssertionError("the whole axis was built")
+    axis = TimeAxis(0, 1, 10**6)
+    monkeypatch.setattr(TimeAxis, '__array__', fail)
+    assert np.take(axis, [0, -1]).tolist() == [0.0, 1.0]
+
+
+@pytest.mark.parametrize('start, stop, size', AXES + [(5, 5, 1)])
+@pytest.mark.parametrize('side', ('left', 'right'))
+def test_searchsorted_matches_numpy(start, stop, size, side):
+    axis = TimeAxis(start, stop, size)
+    expected = np.linspace(start, stop, size)
+    generator = np.random.default_rng(size)
+    span = stop - start or 1
+    times = np.concatenate((generator.uniform(start - span, stop + span, 2000), expected[::max(size//500, 1)],
+                            [start, stop, np.nextafter(stop, np.inf), np.nextafter(start, -np.inf)]))
+    np.testing.assert_array_equal(axis.searchsorted(times, side=side), np.searchsorted(expected, times, side))
+    assert axis.searchsorted(expected[size//2], side=side) == np.searchsorted(expected, expected[size//2], side)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Evenly spaced time axis stored as its first value, last value and size.
+
+The times are computed only for the indices asked for, the whole vector is
+built when the axis is converted with np.asarray, with the same values as
+np.linspace(start, stop, size).
+
+Axe du temps régulier, calculé seulement lorsqu'il est nécessaire.
+
+License : GPL 3
+"""
+
+import numpy as np
+
+
+class TimeAxis:
+    ndim = 1
+
+    def __init__(self, start, stop, size, dtype=float):
+        self.start = start
+        self.stop = stop
+        self.size = int(size)
+        self.shape = (self.size,)
+        self.dtype = np.dtype(dtype)
+        self.delta = (stop - start)/(self.size - 1) if self.size > 1 else 0.0
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return 'TimeAxis({}, {}, {}, {})'.format(self.start, self.stop, self.size, self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.linspace(self.start, self.stop, self.size, dtype=dtype or self.dtype)
+
+    def values(self, indices):
+        """Times at the given indices, the last one is exactly stop as with linspace."""
+        indices = np.asarray(indices)
+        times = (self.start + indices*self.delta).astype(self.dtype)
+        return np.where(indices == self.size - 1, self.dtype.type(self.stop), times)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.values(np.arange(*key.indices(self.size)))
+        if np.ndim(key) == 0:
+            index = int(key)
+            if index < 0:
+                index += self.size
+            if not 0 <= index < self.size:
+                raise IndexError("index {} is out of bounds for a time axis of size {}".format(key, self.size))
+            return self.values(index)[()]
+        indices = np.asarray(key)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return self.values(np.where(indices < 0, indices + self.size, indices))
+
+    def take(self, indices, axis=None, out=None, mode='raise'):
+        """Same as np.take, called by it so the whole axis is not built."""
+        if axis not in (None, 0, -1):
+            raise ValueError("axis {} is out of bounds for a time axis".format(axis))
+        if mode == 'wrap':
+            indices = np.mod(indices, self.size)
+        elif mode == 'clip':
+            indices = np.clip(indices, 0, self.size - 1)
+        values = self[indices]
+        if out is None:
+            return values
+        out[...] = values
+        return out
+
+    def searchsorted(self, times, side='left'):
+        """Same as np.searchsorted on the materialized axis, in O(1) per time."""
+        times = np.asarray(times, dtype=float)
+        if self.size < 2 or self.delta <= 0:
+            return np.searchsorted(np.asarray(self), times, side)
+        index = np.clip(np.floor((times - self.start)/self.delta), -1, self.size - 1).astype(int)
+        # Rounding can put the index one step away, checked against the real times
+        below = self.values(np.clip(index, 0, self.size - 1))
+        above = self.values(np.clip(index + 1, 0, self.size - 1))
+        if side == 'right':
+            index = np.where((index >= 0) & (below > times), index - 1, index)
+            index = np.where((index + 1 < self.size) & (above <= times), index + 1, index)
+        else:
+            index = np.where((index >= 0) & (below >= times), index - 1, index)
+            index = np.where((index + 1 < self.size) & (above < times), index + 1, index)
+        return (index + 1)[()]
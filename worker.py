@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background computation of the convolution.
+
+The interface submits a snapshot of its Convolution, which is computed on a
+worker thread and posted back through a Qt signal. Every submission gets a
+new generation number : older computations are cancelled between blocks and
+their results are never delivered.
+
+Calcul de la convolution en arrière-plan.
+
+License : GPL 3
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from engine import ComputationCancelled
+
+
+class ComputeWorker(QObject):
+    # generation, computed snapshot of the Convolution
+    finished = pyqtSignal(int, object)
+    # generation, exception raised by the computation
+    failed = pyqtSignal(int, object)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.generation = 0
+        self.future = None
+        
+    def submit(self, convolution):
+        self.cancel()
+        generation = self.generation
+        # A single thread, the previous snapshot is done with the spare
+        # buffers before this one starts
+        snapshot = convolution.snapshot(buffers=True)
+        snapshot.cancelled = lambda: generation != self.generation
+        self.future = self.executor.submit(self.run, generation, snapshot)
+        return generation
+    
+    def run(self, generation, snapshot):
+        try:
+            snapshot.compute()
+        except ComputationCancelled:
+            return
+        except Exception as error:
+            if generation == self.generation:
+                self.failed.emit(generation, error)
+            return
+        if generation == self.generation:
+            self.finished.emit(generation, snapshot)
+            
+    def isCurrent(self, generation):
+        return generation == self.generation
+    
+    def isBusy(self):
+        return self.future is not None and not self.future.done()
+            
+    def cancel(self):
+        # A new generation makes the running computation obsolete
+        self.generation += 1
+        if self.future is not None:
+            self.future.cancel()
+            
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)